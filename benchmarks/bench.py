@@ -0,0 +1,219 @@
+# benchmarks/bench.py
+#
+# Wall time, events/sec and peak memory of the simulator, the optimiser grid
+# and the plotter. Run from the repository root:
+#
+#   python -m benchmarks.bench                          quick suite -> bench_results.json
+#   python -m benchmarks.bench --suite full             num_work_items up to 1e6
+#   python -m benchmarks.bench --compare baseline.json  flag regressions against a stored run
+#
+# Every case uses the fixed config below and seed 42, so results only move
+# when the code does.
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from simulator import Simulator
+from optimiser import run_sweep, evaluate_batch
+from visualisation.plotter import plot_simulation_results
+
+BENCH_CONFIG = {
+    "num_developers": 4,
+    "num_testers": 2,
+    "num_business_analysts": 3,
+    "test_failure_chance": 0.3,
+    "smoke_test_failure_chance": 0.4,
+    "durations": {"Backlog": 0, "Develop": 20, "Smoke_Test": 5, "Test": 8, "Rework": 3, "ART": 2, "Release": 3},
+    "num_work_items": 100,
+    "wip_limit": 14,
+    "costs": {"developers": 150, "testers": 120, "business_analysts": 150},
+}
+
+# SimPy's sorted resource queues make big upfront backlogs quadratic, so it
+# stops earlier than the heap engine
+SCALING = {
+    'quick': {'simpy': [100, 1000], 'heap': [100, 1000, 10000]},
+    'full': {'simpy': [100, 1000, 10000], 'heap': [100, 1000, 10000, 100000, 1000000]},
+}
+
+# (developers, testers, business analysts, WIP limit)
+RESOURCES = [(1, 1, 1, 1), (2, 1, 1, 4), (4, 2, 3, 14), (8, 4, 4, 8), (8, 4, 4, 32), (16, 8, 8, 64)]
+
+# Fields compared by --compare, and whether bigger is better
+COMPARED = {'wall_s': False, 'events_per_s': True, 'peak_mb': False}
+
+# Absolute changes below these are noise however large in relative terms
+NOISE = {'wall_s': 0.005, 'peak_mb': 0.5}
+
+
+def simulation_case(engine, num_work_items, **overrides):
+    config = dict(BENCH_CONFIG, engine=engine, num_work_items=num_work_items, **overrides)
+
+    def run():
+        sim = Simulator(config, seed=42)
+        sim.run_simulator()
+        # Both engines number events from one counter, the next id is the count
+        return next(sim.env._eid)
+    return run
+
+
+def grid_configs():
+    return [dict(BENCH_CONFIG, engine='heap', num_work_items=40, num_developers=d, num_testers=t,
+                 num_business_analysts=b, wip_limit=w)
+            for d in (2, 4, 6, 8) for t in (1, 2, 3, 4) for b in (1, 3) for w in (2, 6, 10, 14, 18)]
+
+
+def sweep_case():
+    configs = grid_configs()
+
+    def run():
+        for _ in run_sweep(configs, workers=1, deadline_hours=480, use_cache=False):
+            pass
+    return run
+
+
+def batch_case():
+    configs = grid_configs()
+
+    def run():
+        evaluate_batch(configs, deadline_hours=480)
+    return run
+
+
+def plot_case(num_work_items):
+    config = dict(BENCH_CONFIG, engine='heap', num_work_items=num_work_items)
+    sim = Simulator(config, seed=42)
+    sim.run_simulator()
+
+    def run():
+        fig = plot_simulation_results(sim.metrics, config, sim.env.now)
+        fig.canvas.draw()
+        plt.close(fig)
+    return run
+
+
+def cases(suite):
+    for engine, sizes in SCALING[suite].items():
+        for n in sizes:
+            yield f'scaling/{engine}/{n}', lambda engine=engine, n=n: simulation_case(engine, n)
+    if suite == 'full':
+        n = SCALING['full']['heap'][-1]
+        yield f'scaling/heap-lazy/{n}', lambda: simulation_case('heap', n, arrival_mode='backlog',
+                                                                 streaming_metrics=True)
+    for d, t, b, w in RESOURCES:
+        yield (f'resources/{d}d-{t}t-{b}ba-wip{w}',
+               lambda d=d, t=t, b=b, w=w: simulation_case('heap', 1000, num_developers=d, num_testers=t,
+                                                          num_business_analysts=b, wip_limit=w))
+    yield 'optimiser/grid-heap', sweep_case
+    yield 'optimiser/grid-batch', batch_case
+    for n in (100, 10000):
+        yield f'plot/{n}', lambda n=n: plot_case(n)
+
+
+def measure(make_run, min_time=1.0, max_repeats=5, memory=True):
+    # Best of several timed runs, then one traced run for the memory peak
+    # (tracemalloc slows Python down, so it never overlaps the timing)
+    run = make_run()
+    times = []
+    while len(times) < max_repeats and sum(times) < min_time:
+        start = time.perf_counter()
+        events = run()
+        times.append(time.perf_counter() - start)
+    result = {'wall_s': min(times), 'repeats': len(times)}
+    if events is not None:
+        result['events'] = events
+        result['events_per_s'] = events / result['wall_s']
+    if memory:
+        run = make_run()
+        tracemalloc.start()
+        run()
+        result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def compare(results, baseline, threshold):
+    # Returns the regressions, each (case, field, baseline, new)
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for field, higher_is_better in COMPARED.items():
+            if field not in result or field not in old or old[field] == 0:
+                continue
+            if abs(result[field] - old[field]) < NOISE.get(field, 0):
+                continue
+            change = result[field] / old[field] - 1
+            if (change < -threshold) if higher_is_better else (change > threshold):
+                regressions.append((name, field, old[field], result[field]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulator benchmarks")
+    parser.add_argument('--suite', choices=sorted(SCALING), default='quick')
+    parser.add_argument('--filter', default='', help="Only run cases whose name contains this")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="Results file to check for regressions against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative slowdown or memory growth counted as a regression (default 0.10)")
+    parser.add_argument('--no-memory', action='store_true', help="Skip the tracemalloc pass")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    for name, make_run in cases(args.suite):
+        if args.filter not in name:
+            continue
+        result = measure(make_run, memory=not args.no_memory)
+        results[name] = result
+        line = f"{name:40s} {result['wall_s']:9.3f} s"
+        if 'events_per_s' in result:
+            line += f" {result['events_per_s']:12,.0f} events/s"
+        if 'peak_mb' in result:
+            line += f" {result['peak_mb']:9.1f} MB"
+        print(line, flush=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({'environment': environment(), 'suite': args.suite, 'results': results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, field, old, new in regressions:
+            print(f"REGRESSION {name} {field}: {old:,.3f} -> {new:,.3f} ({new / old - 1:+.0%})")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
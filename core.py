@@ -0,0 +1,56 @@
+# core.py
+#
+# The headless simulation core: load a config, run it and summarise the run.
+# Imports only the simulator and its metrics (SimPy and NumPy), no plotting or
+# UI libraries, so process-pool workers and CLI runs start quickly. Figures
+# live in visualisation/ and are imported where one is drawn.
+
+import json
+import os
+
+from simulator import Simulator
+
+
+def load_config(config_path="config.json"):
+    # A relative path is taken from the repository root
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(script_dir, config_path)) as f:
+        return json.load(f)
+
+def run_simulation(config=None, config_path="config.json", deadline_hours=None, seed=None):
+    if config is None:
+        # Load config from file if no config dict provided
+        config = load_config(config_path)
+    if seed is None:
+        seed = config.get('seed', 42)
+
+    sim = Simulator(config, seed=seed)
+    sim.run_simulator(deadline=deadline_hours)
+    simulation_time = sim.simulation_time
+
+    return sim.metrics, config, simulation_time
+
+def summarise_run(metrics, config, simulation_time):
+    # Plain-data view of a run, small enough to send back from worker processes
+    total_cost = metrics.cost_tracker.compute_total_cost()
+    completed = metrics.completed_items
+    return {
+        "sim_time": simulation_time,
+        "completed": completed,
+        "met_deadline": metrics.met_deadline,
+        "total_cost": total_cost,
+        "cost_per_item": total_cost / max(completed, 1),
+        "time_per_item": simulation_time / max(completed, 1),
+        "flow_efficiency": metrics.get_flow_efficiency(),
+        "utilisation": dict(metrics.utilisation),
+    }
+
+def print_results(metrics, config, simulation_time):
+    print(f'=====Simulation Configuration=====\n')
+    for key, value in config.items():
+        print(f"{key}: {value}")
+
+    print(f'\n=====Simulation Results=====')
+    print(f'\nRun Time: {simulation_time} hours')
+    print(f"Completed Items: {metrics.completed_items}")
+    print(f"Total Cost: ${metrics.cost_tracker.compute_total_cost():,.2f}")
@@ -0,0 +1,140 @@
+# durations.py
+#
+# Stage durations, fixed or drawn from a distribution. A duration (in
+# config["durations"] or a workflow stage's "duration") is either hours or a
+# dict naming a distribution:
+#
+#   {"dist": "lognormal", "mean": 20, "sd": 12}
+#   {"dist": "gamma", "mean": 8, "sd": 4}          (or "shape" and "scale")
+#   {"dist": "triangular", "min": 1, "mode": 2, "max": 6}
+#   {"dist": "empirical", "samples": [14, 18, 20, 22, 41]}   (resampled)
+#
+# Sampled stages draw from a per-simulator NumPy generator in blocks, one
+# vectorised call per stage per block, and the engines pop one Python float
+# at a time from the block, so the hot loop makes no RNG call of its own.
+# Blocks start small and double up to BLOCK, which keeps short runs cheap.
+#
+# With common random numbers the durations are instead drawn up front per item
+# and route op (draw_durations), so item i takes the same time at each visit
+# under any staffing or WIP limit, as its failure draws are fixed.
+
+import math
+
+import numpy as np
+
+DISTRIBUTIONS = ('lognormal', 'gamma', 'triangular', 'empirical')
+
+FIRST_BLOCK = 256
+BLOCK = 1 << 14
+
+
+def parse_duration(stage, spec):
+    # *spec* checked, a number stays as it is
+    if not isinstance(spec, dict):
+        if spec < 0:
+            raise ValueError(f"Stage '{stage}' has a negative duration")
+        return spec
+    dist = spec.get('dist')
+    if dist not in DISTRIBUTIONS:
+        raise ValueError(f"Stage '{stage}' has unknown duration distribution '{dist}', "
+                         f"expected one of {DISTRIBUTIONS}")
+    if dist in ('lognormal', 'gamma') and not ({'mean', 'sd'} <= spec.keys()
+                                               or dist == 'gamma' and {'shape', 'scale'} <= spec.keys()):
+        raise ValueError(f"Stage '{stage}': a {dist} duration needs 'mean' and 'sd'"
+                         + (" (or 'shape' and 'scale')" if dist == 'gamma' else ""))
+    if dist in ('lognormal', 'gamma') and 'mean' in spec and (spec['mean'] <= 0 or spec['sd'] < 0):
+        raise ValueError(f"Stage '{stage}': a {dist} duration needs mean > 0 and sd >= 0")
+    if dist == 'triangular' and not spec['min'] <= spec['mode'] <= spec['max']:
+        raise ValueError(f"Stage '{stage}': a triangular duration needs min <= mode <= max")
+    if dist == 'empirical' and not spec.get('samples'):
+        raise ValueError(f"Stage '{stage}': an empirical duration needs 'samples'")
+    if min_duration(spec) < 0:
+        raise ValueError(f"Stage '{stage}' has negative durations")
+    return spec
+
+
+def mean_duration(spec):
+    if not isinstance(spec, dict):
+        return spec
+    dist = spec['dist']
+    if dist == 'triangular':
+        return (spec['min'] + spec['mode'] + spec['max']) / 3
+    if dist == 'empirical':
+        return sum(spec['samples']) / len(spec['samples'])
+    if dist == 'gamma' and 'mean' not in spec:
+        return spec['shape'] * spec['scale']
+    return spec['mean']
+
+
+def min_duration(spec):
+    # The shortest a stage can take, what the provable bounds use
+    if not isinstance(spec, dict):
+        return spec
+    dist = spec['dist']
+    if dist == 'triangular':
+        return spec['min']
+    if dist == 'empirical':
+        return min(spec['samples'])
+    return 0
+
+
+def sample(spec, rng, size):
+    # *size* durations of a distribution spec as an array
+    dist = spec['dist']
+    if dist == 'lognormal':
+        if spec['sd'] == 0:
+            return np.full(size, float(spec['mean']))
+        sigma2 = math.log1p((spec['sd'] / spec['mean']) ** 2)
+        return rng.lognormal(math.log(spec['mean']) - sigma2 / 2, math.sqrt(sigma2), size)
+    if dist == 'gamma':
+        if 'mean' in spec:
+            if spec['sd'] == 0:
+                return np.full(size, float(spec['mean']))
+            shape, scale = (spec['mean'] / spec['sd']) ** 2, spec['sd'] ** 2 / spec['mean']
+        else:
+            shape, scale = spec['shape'], spec['scale']
+        return rng.gamma(shape, scale, size)
+    if dist == 'triangular':
+        if spec['min'] == spec['max']:
+            return np.full(size, float(spec['min']))
+        return rng.triangular(spec['min'], spec['mode'], spec['max'], size)
+    samples = np.asarray(spec['samples'], dtype=float)
+    return samples[rng.integers(0, len(samples), size)]
+
+
+class DurationSampler:
+    """Stage durations for one run. draw[stage]() returns the stage's next
+    duration, draw[stage] is None for fixed stages (use
+    workflow.stage_duration).
+    """
+
+    def __init__(self, distributions, rng, block=BLOCK):
+        self.rng = rng
+        self.block = block
+        self.draw = [None if spec is None else self._stream(spec).__next__ for spec in distributions]
+
+    def _stream(self, spec):
+        size = min(FIRST_BLOCK, self.block)
+        while True:
+            yield from sample(spec, self.rng, size).tolist()
+            size = min(2 * size, self.block)
+
+
+def duration_stream(seed):
+    # Generator for up-front durations, independent of the failure draws made
+    # from the same seed
+    return np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+
+
+def draw_durations(workflow, rng, shape):
+    """Stage durations for *shape* items (e.g. (N,) or (K, N)) drawn up front,
+    one column per route op, fixed stages at their duration and other ops 0.
+    An item visits each op at most once, so [item, op] is its duration there.
+    """
+    table = np.zeros(tuple(shape) + (len(workflow.op_stage),))
+    for op, stage in enumerate(workflow.op_stage):
+        if stage < 0:
+            continue
+        spec = workflow.stage_distribution[stage]
+        table[..., op] = workflow.stage_duration[stage] if spec is None else sample(spec, rng, shape)
+    return table
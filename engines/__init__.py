@@ -0,0 +1,2 @@
+from .heap import HeapEngine, Pool
+from .batch import simulate_batch
@@ -0,0 +1,225 @@
+# engines/batch.py
+#
+# Lockstep NumPy engine: advances K independent runs of the pipeline together.
+# The pipeline is the config's compiled Workflow (workflow.py).
+# Each run has its own clock; every iteration moves all runs to their next
+# service completion and dispatches free servers, using (K, N) arrays for the
+# item state and (K, pools) arrays for the resources. Failure draws for every
+# item are made up front in one block, and so are sampled durations
+# (durations.py), per item and route op, laid out as the simulator's common
+# random numbers.
+#
+# Dispatch follows the same rules as the SimPy model (non-preemptive stage
+# priorities, first come first served within a priority, FIFO WIP admission),
+# but ties within an instant and the random stream differ, so results match
+# the other engines statistically rather than run for run.
+
+import numpy as np
+
+from durations import draw_durations, duration_stream
+from workflow import Workflow, pool_sizes, STAGE, WIP_ENTER, BRANCH, WIP_EXIT
+
+# Item status
+_WAITING = 0        # queued for the resource of its current stage
+_IN_SERVICE = 1
+_WAITING_WIP = 2
+_DONE = 3
+
+# Parameters other than the pool headcounts that may differ between the runs
+# in one batch
+BATCH_KEYS = {'wip_limit', 'costs', 'engine', 'seed'}
+
+
+def _program(workflow):
+    # The workflow's op tables as arrays, stage fields looked up per op
+    kind = np.array(workflow.op_kind)
+    stage = np.array(workflow.op_stage)
+    is_stage = kind == STAGE
+    pool = np.where(is_stage, np.array(workflow.stage_pool)[stage], -1)
+    priority = np.where(is_stage, np.array(workflow.stage_priority)[stage], 0)
+    duration = np.where(is_stage, np.array(workflow.stage_duration, dtype=float)[stage], 0.0)
+    active = np.where(is_stage, np.array(workflow.stage_active, dtype=float)[stage], 0.0)
+    prob = np.array(workflow.op_prob, dtype=float)
+    # Branches fall through into their body on failure, otherwise skip it
+    jump = np.where(kind == BRANCH, np.array(workflow.op_jump), np.arange(len(kind)) + 1)
+    branch = np.cumsum(kind == BRANCH) - 1
+    return kind, pool, priority, duration, active, prob, jump, branch, workflow.num_branches
+
+
+def simulate_batch(configs, seed=42, seeds=None):
+    """Simulate every config in *configs* in one lockstep pass.
+
+    The configs may only differ in headcounts, WIP limit, costs and seed;
+    the workflow, durations, failure chances and num_work_items must be shared. Run k draws
+    its failures from np.random.default_rng(seeds[k]) when *seeds* is given,
+    otherwise all runs draw from one generator seeded with *seed*. Sampled
+    durations come from a further stream of the same seed, so with *seeds*
+    run k draws exactly what a common_random_numbers Simulator with seeds[k]
+    does.
+
+    Returns a dict of per-run arrays: completion_time (K,), completed (K,),
+    busy_time and utilisation (K, pools) in workflow pool order and
+    flow_efficiency (K,).
+    """
+    configs = list(configs)
+    base = configs[0]
+    if base.get('arrival_mode', 'upfront') != 'upfront':
+        raise ValueError("The batch engine only supports arrival_mode 'upfront'")
+    workflow = Workflow(base)
+    batch_keys = BATCH_KEYS | {key for key in workflow.pool_size_keys if key is not None}
+    for config in configs[1:]:
+        for key, value in config.items():
+            if key not in batch_keys and value != base.get(key):
+                raise ValueError(f"Batch runs must share '{key}'")
+
+    K = len(configs)
+    N = base['num_work_items']
+    P = len(workflow.pool_names)
+    kind, op_pool, op_priority, op_duration, op_active, op_prob, op_jump, op_branch, num_branches = _program(workflow)
+    # Queue order within a pool: stage priority, then request time, then item
+    # index (argmin keeps the first of equal keys). Times closer than about
+    # 1e-5 hours count as simultaneous.
+    op_key = op_priority * 2.0 ** 32
+
+    capacity = np.array([[size for _, size in pool_sizes(config)] for config in configs])
+    wip_limit = np.array([config['wip_limit'] for config in configs])
+
+    if seeds is None:
+        draws = np.random.default_rng(seed).random((K, N, max(num_branches, 1)))
+    else:
+        draws = np.stack([np.random.default_rng(s).random((N, max(num_branches, 1))) for s in seeds])
+    durations = None
+    if workflow.sampled:
+        if seeds is None:
+            durations = draw_durations(workflow, duration_stream(seed), (K, N))
+        else:
+            durations = np.stack([draw_durations(workflow, duration_stream(int(s)), (N,)) for s in seeds])
+
+    # Per-run results, filled in as runs finish
+    completion_time = np.zeros(K)
+    completed = np.zeros(K, dtype=np.int64)
+    busy_time = np.zeros((K, P))
+    efficiency_sum = np.zeros(K)
+
+    # Live state, compacted as runs finish. row maps back to the config index.
+    row = np.arange(K)
+    now = np.zeros(K)
+    pc = np.zeros((K, N), dtype=np.int64)
+    queue_pool = np.full((K, N), -1, dtype=np.int64)   # Pool queued for, -1 if not queued
+    queue_key = np.zeros((K, N))
+    in_wip_queue = np.zeros((K, N), dtype=bool)
+    wip_ready = np.full((K, N), np.inf)
+    finish = np.full((K, N), np.inf)
+    entry = np.zeros((K, N))
+    active_time = np.zeros((K, N))
+    service = np.zeros((K, N))    # Duration of the stage in service
+    busy = np.zeros((K, P), dtype=np.int64)
+    wip = np.zeros(K, dtype=np.int64)
+
+    def start_work(rows):
+        # Hand every free server in *rows* to the head of its queue
+        for p in range(P):
+            queued = queue_pool[rows] == p
+            start = np.minimum(queued.sum(axis=1), capacity[row[rows], p] - busy[rows, p])
+            more = start > 0
+            k, keys, start = rows[more], np.where(queued[more], queue_key[rows[more]], np.inf), start[more]
+            while k.size:
+                j = keys.argmin(axis=1)
+                op = pc[k, j]
+                duration = op_duration[op] if durations is None else durations[row[k], j, op]
+                service[k, j] = duration
+                busy[k, p] += 1
+                busy_time[row[k], p] += duration
+                finish[k, j] = now[k] + duration
+                queue_pool[k, j] = -1
+                start -= 1
+                more = start > 0
+                keys[np.arange(k.size), j] = np.inf
+                k, keys, start = k[more], keys[more], start[more]
+
+    def advance(k, j, op):
+        # Move items (k, j) on to *op*, resolving rework branches on the way,
+        # and queue them for its stage or WIP, or let them leave
+        is_branch = kind[op] == BRANCH
+        while is_branch.any():
+            failed = draws[row[k], j, op_branch[op]] < op_prob[op]
+            op = np.where(is_branch, np.where(failed, op + 1, op_jump[op]), op)
+            is_branch = kind[op] == BRANCH
+        pc[k, j] = op
+
+        next_kind = kind[op]
+        stage = next_kind == STAGE
+        queue_pool[k[stage], j[stage]] = op_pool[op[stage]]
+        queue_key[k[stage], j[stage]] = op_key[op[stage]] + now[k[stage]]
+
+        entering = next_kind == WIP_ENTER
+        in_wip_queue[k[entering], j[entering]] = True
+        wip_ready[k[entering], j[entering]] = now[k[entering]]
+
+        exiting = next_kind == WIP_EXIT
+        if exiting.any():
+            ke, je = k[exiting], j[exiting]
+            np.subtract.at(wip, ke, 1)
+            np.add.at(completed, row[ke], 1)
+            lead = now[ke] - entry[ke, je]
+            efficiency = np.divide(active_time[ke, je], lead, out=np.zeros(lead.size), where=lead > 0)
+            np.add.at(efficiency_sum, row[ke], efficiency)
+            completion_time[row[ke]] = now[ke]
+
+    # Every item starts at the route's first op, which may be the WIP itself
+    k, j = np.divmod(np.arange(K * N), N)
+    advance(k, j, np.zeros(K * N, dtype=np.int64))
+
+    while row.size:
+        live = np.arange(row.size)
+
+        # --- Start work, admit into WIP, then start work for the admitted ---
+        # As in SimPy, items entering WIP request their next stage only after
+        # the servers free at this instant have gone to the requests already
+        # queued, which is how a zero-length Backlog stage lets items in early.
+        start_work(live)
+
+        admit = np.minimum(in_wip_queue.sum(axis=1), wip_limit[row] - wip)
+        k = live[admit > 0]
+        if k.size:
+            admitted = k
+            while k.size:
+                # First come first served
+                j = wip_ready[k].argmin(axis=1)
+                wip[k] += 1
+                entry[k, j] = now[k]
+                in_wip_queue[k, j] = False
+                wip_ready[k, j] = np.inf
+                advance(k, j, pc[k, j] + 1)
+                admit[k] -= 1
+                k = k[admit[k] > 0]
+            start_work(admitted)
+
+        # --- Advance each run to its next completion ---
+        next_time = finish.min(axis=1)
+        done = ~np.isfinite(next_time)
+        if done.any():
+            keep = ~done
+            row, now, next_time, busy, wip = row[keep], now[keep], next_time[keep], busy[keep], wip[keep]
+            pc, queue_pool, queue_key, finish = pc[keep], queue_pool[keep], queue_key[keep], finish[keep]
+            in_wip_queue, wip_ready = in_wip_queue[keep], wip_ready[keep]
+            entry, active_time, service = entry[keep], active_time[keep], service[keep]
+        now = next_time
+
+        k, j = np.nonzero(finish == now[:, None])
+        op = pc[k, j]
+        np.subtract.at(busy, (k, op_pool[op]), 1)
+        active_time[k, j] += np.where(op_active[op] > 0, service[k, j], 0.0)
+        finish[k, j] = np.inf
+
+        # Step past the finished stage
+        advance(k, j, op + 1)
+
+    simulation_time = np.maximum(completion_time, np.finfo(float).tiny)
+    return {
+        'completion_time': completion_time,
+        'completed': completed,
+        'busy_time': busy_time,
+        'utilisation': busy_time / (capacity * simulation_time[:, None]),
+        'flow_efficiency': efficiency_sum / np.maximum(completed, 1),
+    }
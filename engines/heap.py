@@ -0,0 +1,292 @@
+# engines/heap.py
+#
+# Specialised discrete-event engine for the delivery pipeline. It replays
+# exactly the event ordering SimPy produces for simulator.WorkItem (same
+# request/release/container trigger rules, same (time, priority, id) heap
+# order), so the same seed gives the same Metrics, without generators,
+# Request objects or Timeout events. Stages, pools and the route come from
+# the simulator's compiled Workflow (workflow.py).
+
+from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+
+from event_trace import ENTER, START, FINISH, WIP_IN, WIP_OUT, REWORK
+from workflow import STAGE, WIP_ENTER, BRANCH
+
+# SimPy event priorities
+URGENT = 0
+NORMAL = 1
+
+# Event kinds
+_START = 0          # process initialisation
+_GRANT = 1          # resource request succeeded
+_DONE = 2           # stage timeout expired
+_RELEASE = 3        # resource release processed, may grant the next request
+_WIP_GRANT = 4      # WIP container put succeeded
+_WIP_RELEASE = 5    # WIP container get processed, may grant waiting puts
+_SOURCE = 6         # arrival source step (see Simulator.backlog_source/open_source)
+_START_ALL = 7      # initialisation of every upfront item at once
+_AHEAD_RELEASE = 8  # backlog item took its WIP slot, may let the source release another
+
+# A pool queue entry is one int, (priority << 80) | (seq << 40) | item. The
+# clock never goes back, so request order (seq) already orders requests by
+# time, and ints compare faster and take far less memory than tuples.
+_SEQ_SHIFT = 40
+_PRIORITY_SHIFT = 80
+_ITEM_MASK = (1 << _SEQ_SHIFT) - 1
+
+
+class Pool:
+    # Stand-in for simpy.PriorityResource on the heap engine
+    def __init__(self, env, capacity=1):
+        if capacity <= 0:
+            raise ValueError('"capacity" must be > 0.')
+        self.capacity = capacity
+        self.count = 0          # Busy servers
+        self.queue = []         # Heap of packed (priority, seq, item) ints, see _SEQ_SHIFT
+
+
+# Workflow tables the engine reads directly
+WORKFLOW_TABLES = ['stage_names', 'stage_pool', 'stage_priority', 'stage_duration', 'stage_min_duration', 'stage_active',
+                   'op_kind', 'op_stage', 'op_prob', 'op_jump', 'op_rework', 'op_branch']
+
+
+class HeapEngine:
+    """Priority-queue event loop with integer-indexed stages and pools.
+
+    Exposes the parts of simpy.Environment the simulator and metrics use
+    (now, peek, step, run) so it can be passed wherever an env is expected.
+    Work items are plain integer ids into per-item lists (struct of arrays:
+    op index, times, creation order), no object per item. Ids of finished
+    items are reused, so with a lazy arrival mode the lists only grow to the
+    number of items in flight.
+    """
+
+    def __init__(self):
+        self.now = 0
+        self._queue = []
+        self._eid = count()
+        self._seq = count()
+        self.sim = None
+
+    def peek(self):
+        return self._queue[0][0] if self._queue else float('inf')
+
+    def add_work_items(self, sim, num_items, arrival_mode='upfront'):
+        self.sim = sim
+        self.metrics = sim.metrics
+        for key in WORKFLOW_TABLES:
+            setattr(self, key, getattr(sim.workflow, key))
+        self.pools = sim.team.pools
+        self.draw_duration = sim.draw_duration
+        self.duration_draws = sim.duration_draws
+        self.trace = sim.trace
+        lowest = min(self.stage_priority, default=0)
+        self.stage_key = [(priority - lowest) << _PRIORITY_SHIFT for priority in self.stage_priority]
+        self.wip_capacity = sim.config['wip_limit']
+        self.wip_level = 0
+        self.wip_queue = deque()
+        # Backlog mode: released items short of a WIP slot (Simulator.ahead)
+        self.ahead_level = 0
+        self.source_waiting = False
+
+        # Upfront runs know their item count and size the lists once
+        size = num_items if arrival_mode == 'upfront' else 0
+        self.pc = [-1] * size
+        self.arrival = [0] * size
+        self.start_time = [0] * size
+        self.active_time = [0] * size
+        self.entry_time = [0] * size
+        self.serial = list(range(size))     # Creation order, indexes sim.failure_draws and duration_draws
+        self.free_items = []
+        self.num_spawned = 0
+
+        self.arrival_mode = arrival_mode
+        self.to_release = num_items
+        if arrival_mode == 'upfront':
+            # SimPy starts each item with its own URGENT event at t=0, and as
+            # nothing else is URGENT they run back to back. One event starts
+            # them all in the same order, its ids reserved so every later
+            # event keeps the id it would have had.
+            first = next(self._eid)
+            self._eid = count(first + num_items)
+            self.num_spawned = self.num_slots = num_items
+            self.to_release = 0
+            heappush(self._queue, (self.now, URGENT, first, _START_ALL, num_items))
+        else:
+            self.num_slots = 0
+            heappush(self._queue, (self.now, URGENT, next(self._eid), _SOURCE, None))
+
+    def _spawn(self):
+        # Start a new work item, reusing the id of a finished one if possible
+        if self.free_items:
+            item = self.free_items.pop()
+            self.pc[item] = -1
+            self.active_time[item] = 0
+            self.serial[item] = self.num_spawned
+        else:
+            item = self.num_slots
+            self.num_slots += 1
+            self.pc.append(-1)
+            self.arrival.append(0)
+            self.start_time.append(0)
+            self.active_time.append(0)
+            self.entry_time.append(0)
+            self.serial.append(self.num_spawned)
+        self.num_spawned += 1
+        self.to_release -= 1
+        heappush(self._queue, (self.now, URGENT, next(self._eid), _START, item))
+
+    def run(self):
+        queue = self._queue
+        step = self.step
+        while queue:
+            step()
+
+    def step(self):
+        self.now, _, _, kind, arg = heappop(self._queue)
+
+        if kind == _DONE:
+            item = arg
+            stage = self.op_stage[self.pc[item]]
+            name = self.stage_names[stage]
+            self.metrics.log_resource_utilisation(name, self.start_time[item], self.now)
+            if self.trace is not None:
+                self.trace.record(FINISH, self.serial[item], stage, self.now)
+            pool = self.pools[self.stage_pool[stage]]
+            pool.count -= 1
+            heappush(self._queue, (self.now, NORMAL, next(self._eid), _RELEASE, pool))
+            self._advance(item)
+
+        elif kind == _GRANT:
+            item = arg
+            stage = self.op_stage[self.pc[item]]
+            name = self.stage_names[stage]
+            if self.duration_draws is not None:
+                duration = float(self.duration_draws[self.serial[item], self.pc[item]])
+            else:
+                draw = self.draw_duration[stage]
+                duration = self.stage_duration[stage] if draw is None else draw()
+            self.start_time[item] = self.now
+            # Only read when the item leaves WIP, so it can count the work now
+            if self.stage_active[stage]:
+                self.active_time[item] += duration
+            if self.sim.deadline is not None:
+                self.sim.add_remaining_work(stage, -self.stage_min_duration[stage])
+            self.metrics.record_wait(name, self, self.arrival[item])
+            self.metrics.queue_exit(name, self.now)
+            if self.trace is not None:
+                self.trace.record(START, self.serial[item], stage, self.now)
+            heappush(self._queue, (self.now + duration, NORMAL, next(self._eid), _DONE, item))
+
+        elif kind == _RELEASE:
+            self._trigger(arg)
+
+        elif kind == _WIP_GRANT:
+            item = arg
+            if self.arrival_mode == 'backlog':
+                self.ahead_level -= 1
+                heappush(self._queue, (self.now, NORMAL, next(self._eid), _AHEAD_RELEASE, None))
+            self.metrics.log_wip(self, +1)
+            self.entry_time[item] = self.now
+            if self.trace is not None:
+                self.trace.record(WIP_IN, self.serial[item], -1, self.now)
+            self._advance(item)
+
+        elif kind == _WIP_RELEASE:
+            self._trigger_wip()
+
+        elif kind == _SOURCE:
+            if self.arrival_mode == 'backlog':
+                # arg is None when the source starts, else it got room for an item
+                if arg:
+                    self._spawn()
+                if self.to_release:
+                    self._ahead_put()
+            elif self.to_release:
+                self._spawn()
+                if self.to_release:
+                    heappush(self._queue, (self.now + self.sim.interarrival_time(), NORMAL,
+                                           next(self._eid), _SOURCE, None))
+
+        elif kind == _AHEAD_RELEASE:
+            if self.source_waiting:
+                self.source_waiting = False
+                self._ahead_put()
+
+        elif kind == _START_ALL:
+            # serial is 0..arg-1 here, iterating it shares its int objects
+            for item in self.serial:
+                self._advance(item)
+
+        else:
+            self._advance(arg)
+
+    def _trigger(self, pool):
+        # Like Resource._trigger_put, only the head of the queue is examined
+        if pool.queue and pool.count < pool.capacity:
+            item = heappop(pool.queue) & _ITEM_MASK
+            pool.count += 1
+            heappush(self._queue, (self.now, NORMAL, next(self._eid), _GRANT, item))
+
+    def _trigger_wip(self):
+        while self.wip_queue and self.wip_level < self.wip_capacity:
+            item = self.wip_queue.popleft()
+            self.wip_level += 1
+            heappush(self._queue, (self.now, NORMAL, next(self._eid), _WIP_GRANT, item))
+
+    def _ahead_put(self):
+        # Backlog source asks for room for its next item, see Simulator.backlog_source
+        if self.ahead_level < self.wip_capacity:
+            self.ahead_level += 1
+            heappush(self._queue, (self.now, NORMAL, next(self._eid), _SOURCE, True))
+        else:
+            self.source_waiting = True
+
+    def _advance(self, item):
+        # Move the item to its next op, resolving rework branches on the way
+        op_kind = self.op_kind
+        pc = self.pc[item] + 1
+        draws = self.sim.failure_draws
+        while op_kind[pc] == BRANCH:
+            if draws is None:
+                draw = self.sim.rng.random()
+            else:
+                draw = draws[self.serial[item], self.op_branch[pc]]
+            if draw < self.op_prob[pc]:
+                if self.trace is not None:
+                    self.trace.record(REWORK, self.serial[item], self.op_branch[pc], self.now)
+                if self.sim.deadline is not None:
+                    for stage in self.op_rework[pc]:
+                        self.sim.add_remaining_work(stage, self.stage_min_duration[stage])
+                pc += 1
+            else:
+                pc = self.op_jump[pc]
+        self.pc[item] = pc
+        kind = op_kind[pc]
+
+        if kind == STAGE:
+            stage = self.op_stage[pc]
+            name = self.stage_names[stage]
+            self.arrival[item] = self.metrics.record_arrival(name, self)
+            self.metrics.queue_enter(name, self.now)
+            if self.trace is not None:
+                self.trace.record(ENTER, self.serial[item], stage, self.now)
+            pool = self.pools[self.stage_pool[stage]]
+            heappush(pool.queue, self.stage_key[stage] | next(self._seq) << _SEQ_SHIFT | item)
+            self._trigger(pool)
+
+        elif kind == WIP_ENTER:
+            self.wip_queue.append(item)
+            self._trigger_wip()
+
+        else:
+            self.metrics.log_wip(self, -1)
+            self.metrics.completed_items += 1
+            self.metrics.item_exit(self.entry_time[item], self.active_time[item], self)
+            if self.trace is not None:
+                self.trace.record(WIP_OUT, self.serial[item], -1, self.now)
+            self.wip_level -= 1
+            self.free_items.append(item)
+            heappush(self._queue, (self.now, NORMAL, next(self._eid), _WIP_RELEASE, None))
@@ -0,0 +1,229 @@
+# event_trace.py
+#
+# Binary event traces of a run ("trace_path" in the config), so a run can be
+# analysed, shared and re-plotted later without simulating it again. Both
+# engines report every stage enter (queued), start, finish, WIP entry and
+# exit and failed check (rework) with the item's creation index, and the
+# recorder keeps them as typed columns, spilling to temporary files once
+# CHUNK_EVENTS pile up so memory stays bounded however long the run.
+#
+# File layout: MAGIC, the header length (uint64, little endian), a JSON header
+# (run metadata, and dtype and byte offset of each column) padded to 8 bytes,
+# then the columns back to back, each 8-byte aligned, so load_trace can
+# memory-map them. The same seed gives the same events on either engine.
+#
+# Trace.metrics() replays the events through Metrics (or StreamingMetrics),
+# which gives back the metrics of the run for plot_simulation_results and
+# friends.
+
+import json
+import os
+import shutil
+import struct
+import tempfile
+from array import array
+
+import numpy as np
+
+from metrics import Metrics, StreamingMetrics
+from workflow import Workflow
+
+MAGIC = b'SIMTRACE'
+VERSION = 1
+
+# Event kinds
+ENTER = 0       # queued for the stage's pool
+START = 1       # pool granted, service starts
+FINISH = 2
+WIP_IN = 3
+WIP_OUT = 4     # item done, WIP slot released
+REWORK = 5      # failed check, stage holds the branch index (workflow.op_branch)
+
+KIND_NAMES = ['enter', 'start', 'finish', 'wip_in', 'wip_out', 'rework']
+
+# (column, array typecode), numpy reads the same typecodes
+COLUMNS = [('time', 'd'), ('item', 'i'), ('stage', 'h'), ('kind', 'B')]
+
+CHUNK_EVENTS = 1 << 20
+REPLAY_CHUNK = 1 << 18
+
+
+class TraceRecorder:
+    """Collects the events of one Simulator run and writes them to *path*
+    when the run ends. Stage is -1 for WIP events.
+    """
+
+    def __init__(self, path, chunk_events=CHUNK_EVENTS):
+        self.path = path
+        self.chunk_events = chunk_events
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+        self.time = self.columns['time'].append
+        self.item = self.columns['item'].append
+        self.stage = self.columns['stage'].append
+        self.kind = self.columns['kind'].append
+        self.buffered = 0
+        self.spill = None
+
+    def record(self, kind, item, stage, now):
+        self.time(now)
+        self.item(item)
+        self.stage(stage)
+        self.kind(kind)
+        self.buffered += 1
+        if self.buffered >= self.chunk_events:
+            self._spill()
+
+    def _spill(self):
+        # Move the buffered events to one temporary file per column
+        if self.spill is None:
+            self.spill = {name: tempfile.TemporaryFile() for name, _ in COLUMNS}
+        for name, column in self.columns.items():
+            column.tofile(self.spill[name])
+            del column[:]
+        self.buffered = 0
+
+    def close(self, sim):
+        # Write the file, with what is needed to replay the run
+        workflow = sim.workflow
+        num_events = self.buffered
+        if self.spill is not None:
+            self._spill()
+            num_events = self.spill['kind'].tell()     # One byte per event
+        meta = {
+            'config': sim.config,
+            'seed': sim.seed,
+            'engine': sim.config.get('engine', 'simpy'),
+            'sim_time': sim.simulation_time,
+            'met_deadline': sim.metrics.met_deadline,
+            'completed_items': sim.metrics.completed_items,
+            'stage_names': workflow.stage_names,
+            'stage_active': workflow.stage_active,
+            'stage_sampled': [spec is not None for spec in workflow.stage_distribution],
+            'branch_rework': [[workflow.stage_names[stage] for stage in rework]
+                              for rework in workflow.op_rework if rework is not None],
+        }
+        columns, offset = [], 0
+        for name, typecode in COLUMNS:
+            columns.append({'name': name, 'dtype': np.dtype(typecode).str, 'offset': offset})
+            offset += _aligned(num_events * np.dtype(typecode).itemsize)
+        header = json.dumps({'version': VERSION, 'num_events': num_events, 'columns': columns,
+                             'meta': meta}, default=str).encode()
+        header += b' ' * (_aligned(len(MAGIC) + 8 + len(header)) - len(MAGIC) - 8 - len(header))
+        start = len(MAGIC) + 8 + len(header)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+            for column, (name, typecode) in zip(columns, COLUMNS):
+                f.seek(start + column['offset'])
+                if self.spill is not None:
+                    self.spill[name].seek(0)
+                    shutil.copyfileobj(self.spill[name], f)
+                    self.spill[name].close()
+                else:
+                    self.columns[name].tofile(f)
+            f.truncate(start + offset)
+        os.replace(tmp_path, self.path)
+        self.spill = None
+
+
+def _aligned(size):
+    return (size + 7) // 8 * 8
+
+
+class _Clock:
+    # Stands in for the env in Metrics calls during a replay
+    now = 0
+
+
+class _ReplayTeam:
+    # What Metrics reads from a Team
+    def __init__(self, config):
+        self.config = config
+        self.workflow = Workflow(config)
+        self.stage_resources = {name: None for name in self.workflow.stage_names}
+
+
+class Trace:
+    """A trace file, its columns memory-mapped (time, item, stage, kind as
+    numpy arrays) and the run's metadata in `meta`.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a simulation trace")
+            size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(size))
+        if header['version'] != VERSION:
+            raise ValueError(f"{path} is trace version {header['version']}, expected {VERSION}")
+        self.path = path
+        self.meta = header['meta']
+        self.num_events = header['num_events']
+        start = len(MAGIC) + 8 + size
+        for column in header['columns']:
+            data = (np.memmap(path, dtype=column['dtype'], mode='r', offset=start + column['offset'],
+                              shape=(self.num_events,))
+                    if self.num_events else np.empty(0, dtype=column['dtype']))
+            setattr(self, column['name'], data)
+        self.stage_names = self.meta['stage_names']
+
+    def __len__(self):
+        return self.num_events
+
+    def item_events(self, item):
+        # (time, kind name, stage name or branch) for one item, in order
+        rows = np.flatnonzero(self.item == item)
+        events = []
+        for time, kind, stage in zip(self.time[rows].tolist(), self.kind[rows].tolist(), self.stage[rows].tolist()):
+            label = stage if kind == REWORK else (self.stage_names[stage] if stage >= 0 else None)
+            events.append((time, KIND_NAMES[kind], label))
+        return events
+
+    def metrics(self, streaming=False, trace_capacity=2048):
+        """Rebuild the run's Metrics (StreamingMetrics if *streaming*) by
+        replaying the events through them, in chunks of REPLAY_CHUNK."""
+        team = _ReplayTeam(self.meta['config'])
+        metrics = StreamingMetrics(team, trace_capacity) if streaming else Metrics(team)
+        clock = _Clock()
+        names = self.stage_names
+        stage_active = self.meta['stage_active']
+        sampled = self.meta.get('stage_sampled') or [False] * len(names)
+        arrival, start, entry, active = {}, {}, {}, {}
+
+        for lo in range(0, self.num_events, REPLAY_CHUNK):
+            hi = lo + REPLAY_CHUNK
+            for now, item, stage, kind in zip(self.time[lo:hi].tolist(), self.item[lo:hi].tolist(),
+                                              self.stage[lo:hi].tolist(), self.kind[lo:hi].tolist()):
+                clock.now = now
+                if kind == ENTER:
+                    name = names[stage]
+                    arrival[item] = metrics.record_arrival(name, clock)
+                    metrics.queue_enter(name, now)
+                elif kind == START:
+                    name = names[stage]
+                    start[item] = now
+                    metrics.record_wait(name, clock, arrival[item])
+                    metrics.queue_exit(name, now)
+                elif kind == FINISH:
+                    metrics.log_resource_utilisation(names[stage], start[item], now)
+                    # A sampled duration is only in the trace as finish - start
+                    work = now - start[item] if sampled[stage] and stage_active[stage] else stage_active[stage]
+                    active[item] = active.get(item, 0) + work
+                elif kind == WIP_IN:
+                    metrics.log_wip(clock, +1)
+                    entry[item] = now
+                elif kind == WIP_OUT:
+                    metrics.log_wip(clock, -1)
+                    metrics.completed_items += 1
+                    metrics.item_exit(entry.pop(item), active.pop(item, 0), clock)
+                    arrival.pop(item, None)
+                    start.pop(item, None)
+
+        metrics.met_deadline = self.meta['met_deadline']
+        metrics.cost_tracker.set_simulation_time(self.meta['sim_time'])
+        return metrics
+
+
+def load_trace(path):
+    return Trace(path)
@@ -0,0 +1,138 @@
+# instrumentation.py
+#
+# Opt-in run instrumentation ("instrument": true in the config). The
+# simulator's env.step and the Metrics callbacks are wrapped with counting and
+# timing shims for the duration of run_simulator and restored afterwards, so
+# nothing on the hot path changes when instrumentation is off.
+
+import cProfile
+import time
+from contextlib import contextmanager
+
+# Metrics methods the engines call while a run is in progress
+CALLBACKS = ['record_arrival', 'queue_enter', 'queue_exit', 'record_wait',
+             'log_resource_utilisation', 'log_wip', 'item_exit']
+
+
+class Instrumentation:
+    """Counters and timings for one Simulator run.
+
+    With *profile_path* the run is also profiled with cProfile and the stats
+    dumped there ("{seed}" in the path is replaced by the run's seed).
+    report() returns everything as plain data. A stage's queue_on_arrival
+    figures are the length of its resource pool's queue when a request joins
+    it, pools being shared between stages.
+    """
+
+    def __init__(self, sim, profile_path=None):
+        self.sim = sim
+        self.profile_path = profile_path.format(seed=sim.seed) if profile_path else None
+        self.wall_time = 0.0
+        self.events = 0
+        self.event_queue_max = 0
+        self.event_queue_total = 0
+        self.callbacks = {name: [0, 0.0] for name in CALLBACKS}   # calls, seconds
+        self.stages = {}
+        self.phases = {}
+
+    def _stage(self, stage_name):
+        stage = self.stages.get(stage_name)
+        if stage is None:
+            stage = self.stages[stage_name] = {'requests': 0, 'grants': 0, 'completions': 0,
+                                               'queue_on_arrival_max': 0, 'queue_on_arrival_total': 0}
+        return stage
+
+    def _wrap_step(self, env):
+        step = env.step
+        queue = env._queue
+
+        def counted_step():
+            self.events += 1
+            size = len(queue)
+            self.event_queue_total += size
+            if size > self.event_queue_max:
+                self.event_queue_max = size
+            step()
+        env.step = counted_step
+
+    def _wrap_callback(self, metrics, name):
+        method = getattr(metrics, name)
+        counters = self.callbacks[name]
+        clock = time.perf_counter
+        resources = self.sim.team.stage_resources
+
+        def timed(*args):
+            if name == 'record_arrival':
+                stage = self._stage(args[0])
+                stage['requests'] += 1
+                waiting = len(resources[args[0]].queue)
+                stage['queue_on_arrival_total'] += waiting
+                if waiting > stage['queue_on_arrival_max']:
+                    stage['queue_on_arrival_max'] = waiting
+            elif name == 'queue_exit':
+                self._stage(args[0])['grants'] += 1
+            elif name == 'log_resource_utilisation':
+                self._stage(args[0])['completions'] += 1
+            start = clock()
+            result = method(*args)
+            counters[1] += clock() - start
+            counters[0] += 1
+            return result
+        setattr(metrics, name, timed)
+
+    def run(self, run_simulator, deadline=None):
+        env, metrics = self.sim.env, self.sim.metrics
+        self._wrap_step(env)
+        for name in CALLBACKS:
+            self._wrap_callback(metrics, name)
+        profiler = cProfile.Profile() if self.profile_path else None
+        start = time.perf_counter()
+        try:
+            if profiler is not None:
+                profiler.runcall(run_simulator, deadline)
+            else:
+                run_simulator(deadline)
+        finally:
+            self.wall_time = time.perf_counter() - start
+            # Back to the plain bound methods so the Metrics can be pickled
+            del env.step
+            for name in CALLBACKS:
+                delattr(metrics, name)
+            if profiler is not None:
+                profiler.dump_stats(self.profile_path)
+
+    @contextmanager
+    def timed(self, phase):
+        # Time work outside the run (plotting, say) into the same report
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + time.perf_counter() - start
+
+    def report(self):
+        metrics_time = sum(seconds for _, seconds in self.callbacks.values())
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {
+                'requests': stage['requests'],
+                'grants': stage['grants'],
+                'completions': stage['completions'],
+                'queue_on_arrival_max': stage['queue_on_arrival_max'],
+                'queue_on_arrival_mean': stage['queue_on_arrival_total'] / max(stage['requests'], 1),
+            }
+        return {
+            'engine': self.sim.config.get('engine', 'simpy'),
+            'wall_s': self.wall_time,
+            'events': self.events,
+            'events_per_s': self.events / self.wall_time if self.wall_time else 0.0,
+            'event_queue_max': self.event_queue_max,
+            'event_queue_mean': self.event_queue_total / max(self.events, 1),
+            'metrics_s': metrics_time,
+            'engine_s': self.wall_time - metrics_time,
+            'callbacks': {name: {'calls': calls, 'seconds': seconds}
+                          for name, (calls, seconds) in self.callbacks.items()},
+            'stages': stages,
+            'phases': dict(self.phases),
+            'profile_path': self.profile_path,
+        }
@@ -0,0 +1,123 @@
+# jobs.py
+#
+# Background jobs for the Streamlit apps. A job runs a sweep in a worker
+# thread (the sweep itself still fans out to the process pool) and collects
+# results as they arrive, so the page can poll it, show partial results and
+# cancel it. The manager is meant to live in st.cache_resource, which keeps
+# jobs across reruns and page reloads: a session re-attaches by job id.
+
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """One background sweep over *total* configs.
+
+    The target calls record(index, statistics) for each result, which raises
+    JobCancelled once cancel() has been called; raising out of the sweep's
+    loop closes its generator, which shuts its process pool down. *info* is
+    kept for the page (the configs, the inputs the sweep was run with).
+    """
+
+    def __init__(self, target, total, info):
+        self.id = uuid.uuid4().hex[:12]
+        self.target = target
+        self.total = total
+        self.info = info
+        self.statistics = [None] * total
+        self.done = 0
+        self.expected = None          # results the sweep will produce, if known
+        self.report = {}
+        self.status = 'queued'
+        self.error = None
+        self.submitted = time.time()
+        self.started = self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    def record(self, index, statistics):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        with self._lock:
+            if self.statistics[index] is None:
+                self.done += 1
+            self.statistics[index] = statistics
+
+    def cancel(self):
+        self._cancel.set()
+        if self.status == 'queued':
+            self.status = 'cancelled'
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    @property
+    def running(self):
+        return self.status in ('queued', 'running')
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def snapshot(self):
+        # Copy of the results so far, safe to use while the job runs
+        with self._lock:
+            return list(self.statistics)
+
+    def _run(self):
+        if self._cancel.is_set():
+            self.status = 'cancelled'
+            self.finished = time.time()
+            return
+        self.status = 'running'
+        self.started = time.time()
+        try:
+            self.target(self)
+            self.status = 'cancelled' if self._cancel.is_set() else 'finished'
+        except JobCancelled:
+            self.status = 'cancelled'
+        except Exception:
+            self.error = traceback.format_exc()
+            self.status = 'failed'
+        finally:
+            self.finished = time.time()
+
+
+class JobManager:
+    """Runs up to *max_running* jobs at once, the rest wait their turn.
+
+    Finished jobs are forgotten *keep_seconds* after they end.
+    """
+
+    def __init__(self, max_running=1, keep_seconds=3600):
+        self.executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix='sweep-job')
+        self.keep_seconds = keep_seconds
+        self.jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, target, total, **info):
+        job = Job(target, total, info)
+        with self._lock:
+            self._forget_old()
+            self.jobs[job.id] = job
+        self.executor.submit(job._run)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _forget_old(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if not job.running and job.finished is not None and now - job.finished > self.keep_seconds:
+                del self.jobs[job_id]
@@ -1,22 +1,37 @@
+import argparse
 import json
-import os
-import random
-from visualisation import plotter
+from core import load_config
+from event_trace import load_trace
 from simulator import Simulator
-import matplotlib.pyplot as plt
+
+def replay(path):
+    # Plot a stored run from its trace (config "trace_path"), no simulation
+    trace = load_trace(path)
+    config = trace.meta['config']
+    metrics = trace.metrics(streaming=config.get('streaming_metrics', False),
+                            trace_capacity=config.get('trace_capacity', 2048))
+    print(f'=====Replayed Trace=====\n')
+    print(f"{path}: {len(trace)} events, {trace.meta['engine']} engine, seed {trace.meta['seed']}")
+    print(f"\nRun Time: {trace.meta['sim_time']} hours")
+    print(f"Completed Items: {metrics.completed_items}")
+    from visualisation import plotter
+    import matplotlib.pyplot as plt
+    plotter.plot_simulation_results(metrics, config, trace.meta['sim_time'])
+    plt.show()
 
 def main():
-    # Load config
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    config_path = os.path.join(script_dir, 'config.json')
+    parser = argparse.ArgumentParser(description='Run the simulation in config.json and plot it')
+    parser.add_argument('--replay', metavar='TRACE', help='plot a stored event trace instead of simulating')
+    args = parser.parse_args()
+    if args.replay:
+        replay(args.replay)
+        return
 
-    with open(config_path) as f:
-        config = json.load(f)
+    # Load config
+    config = load_config()
 
-    random.seed(42)    
-    
     # Run simulation
-    sim = Simulator(config)
+    sim = Simulator(config, seed=config.get('seed', 42))
     sim.run_simulator()
 
     #Tracks end time of simulation
@@ -33,8 +48,16 @@ def main():
     print(f"Total Cost: ${sim.team.cost_tracker.compute_total_cost():,.2f}")
 
 
-    # Plot simulation results
-    fig = plotter.plot_simulation_results(sim.metrics, config, sim.env.now)
+    # Plot simulation results, plotting only loads once a figure is wanted
+    from visualisation import plotter
+    import matplotlib.pyplot as plt
+    if sim.instrumentation is not None:
+        with sim.instrumentation.timed('plot'):
+            fig = plotter.plot_simulation_results(sim.metrics, config, sim.env.now)
+        print(f'\n=====Instrumentation=====\n')
+        print(json.dumps(sim.instrumentation.report(), indent=2))
+    else:
+        fig = plotter.plot_simulation_results(sim.metrics, config, sim.env.now)
     plt.show()  # Show the plots
 
 if __name__ == "__main__":
@@ -0,0 +1,79 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from optimiser import SensitivityAnalysis, default_factors, default_workers
+from optimiser.sensitivity import OUTPUTS
+
+# Measures printed per method, the first is the one factors are ranked by
+COLUMNS = {
+    'one_at_a_time': ['swing', 'low', 'high'],
+    'morris': ['mu_star', 'mu', 'sigma'],
+    'sobol': ['total', 'total_ci', 'first', 'first_ci'],
+}
+
+
+def parse_factor(text):
+    # "durations.Develop=10:30" -> ('durations.Develop', (10.0, 30.0))
+    name, _, bounds = text.partition('=')
+    low, _, high = bounds.partition(':')
+    try:
+        return name, (float(low), float(high))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected NAME=LOW:HIGH, got '{text}'")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank the stage durations and failure chances by how much "
+                                                 "they drive completion time and cost per item.")
+    parser.add_argument('config', nargs='?', default='config.json', help="Base config (JSON)")
+    parser.add_argument('--method', choices=list(COLUMNS), default='morris')
+    parser.add_argument('--samples', type=int,
+                        help="Sobol rows per matrix (default 256), Morris trajectories (default 10) or "
+                             "one-at-a-time levels per factor (default 5)")
+    parser.add_argument('--spread', type=float, default=0.5,
+                        help="Default factor ranges are the base value +/- this fraction (default 0.5)")
+    parser.add_argument('--factor', type=parse_factor, action='append', metavar='NAME=LOW:HIGH',
+                        help="Analyse this factor over this range, repeat for more (default: every duration "
+                             "and failure chance)")
+    parser.add_argument('--replications', type=int, default=1, help="Seeds per design point")
+    parser.add_argument('--engine', default='heap', help="Simulation engine (default heap)")
+    parser.add_argument('--workers', type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the sample design")
+    parser.add_argument('--plot', help="Save the tornado / indices plots here, one per output named by "
+                                       "'{output}' in the path or a suffix")
+    parser.add_argument('--no-cache', action='store_true', help="Skip the shared result cache")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        base = dict(json.load(f), engine=args.engine)
+    factors = dict(args.factor) if args.factor else default_factors(base, args.spread)
+    analysis = SensitivityAnalysis(base, factors, args.replications, workers=args.workers,
+                                   use_cache=not args.no_cache, seed=args.seed)
+
+    started = time.monotonic()
+    options = {'sobol': 'samples', 'morris': 'trajectories', 'one_at_a_time': 'levels'}
+    kwargs = {options[args.method]: args.samples} if args.samples else {}
+    report = getattr(analysis, args.method)(**kwargs)
+    print(f"{report['runs']} runs in {time.monotonic() - started:.1f} s")
+
+    for output in OUTPUTS:
+        columns = COLUMNS[args.method]
+        print(f"\n=====Sensitivity of {output}=====\n")
+        print(f"{'factor':<30}" + ''.join(f"{column:>12}" for column in columns))
+        for name, measures in report['indices'][output].items():
+            print(f"{name:<30}" + ''.join(f"{measures[column]:>12.3f}" for column in columns))
+
+    if args.plot:
+        from visualisation.plotter import plot_sensitivity
+        for output in OUTPUTS:
+            root, extension = os.path.splitext(args.plot)
+            path = args.plot.replace('{output}', output) if '{output}' in args.plot else f"{root}_{output}{extension}"
+            plot_sensitivity(report, output).savefig(path, bbox_inches='tight')
+            print(f"Saved {path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
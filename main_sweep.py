@@ -0,0 +1,143 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from optimiser import run_replicated_sweep, run_pruned_sweep, run_successive_halving, default_workers, SweepStore
+
+# Example spec (JSON), every key optional except "grid":
+# {
+#   "config": "config.json",                  base config, relative to the spec file
+#   "overrides": {"engine": "heap"},          applied on top of the base config
+#   "grid": {
+#     "num_developers": {"min": 1, "max": 8}, inclusive range, optional "step"
+#     "wip_limit": [4, 8, 12]                 or an explicit list of values
+#   },
+#   "replications": 5,
+#   "base_seed": 42,
+#   "deadline_hours": 480,
+#   "prune": true,                            skip configs the analytical bounds rule out
+#                                             (optimiser/prescreen.py, needs deadline_hours)
+#   "halving": {"eta": 3, "rungs": 3}         race the configs on cheap runs first, only the
+# }                                           finalists are stored (optimiser/halving.py)
+
+
+def load_spec(spec_path):
+    with open(spec_path) as f:
+        spec = json.load(f)
+    if not spec.get('grid'):
+        raise ValueError(f"{spec_path} has no 'grid' to sweep")
+    return spec
+
+
+def grid_values(axis):
+    if isinstance(axis, dict):
+        return list(range(axis['min'], axis['max'] + 1, axis.get('step', 1)))
+    return list(axis)
+
+
+def grid_size(spec):
+    size = 1
+    for axis in spec['grid'].values():
+        size *= len(grid_values(axis))
+    return size
+
+
+def grid_configs(spec, spec_path):
+    # Every grid point in a fixed order, so an index always names the same config
+    config_path = os.path.join(os.path.dirname(os.path.abspath(spec_path)), spec.get('config', 'config.json'))
+    with open(config_path) as f:
+        base = dict(json.load(f), **spec.get('overrides', {}))
+    names = list(spec['grid'])
+    for values in itertools.product(*(grid_values(spec['grid'][name]) for name in names)):
+        yield dict(base, **dict(zip(names, values)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a configuration sweep without the Streamlit UI. "
+                                                 "Results are appended to a SQLite store as they finish, "
+                                                 "running again with the same store resumes the sweep.")
+    parser.add_argument('spec', help="Sweep spec (JSON)")
+    parser.add_argument('--store', help="Results database (default: the spec path with .sqlite)")
+    parser.add_argument('--workers', type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument('--fresh', action='store_true', help="Discard stored results and start over")
+    parser.add_argument('--no-cache', action='store_true', help="Skip the shared result cache")
+    args = parser.parse_args(argv)
+
+    spec = load_spec(args.spec)
+    store_path = args.store or os.path.splitext(args.spec)[0] + '.sqlite'
+    if args.fresh:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(store_path + suffix):
+                os.remove(store_path + suffix)
+    store = SweepStore(store_path, spec)
+
+    total = grid_size(spec)
+    skipped = store.skipped()
+    done = store.completed() | set(skipped)
+    indices = [index for index in range(total) if index not in done]
+    configs = [config for index, config in enumerate(grid_configs(spec, args.spec)) if index not in done]
+    print(f"{len(done)}/{total} configurations already in {store_path} ({len(skipped)} of them skipped), "
+          f"{len(indices)} not evaluated yet")
+
+    started = last_report = time.monotonic()
+    finished = 0
+    prune_report = {}
+    try:
+        if spec.get('halving') is not None and spec.get('deadline_hours') is not None:
+            sweep = run_successive_halving(configs, spec['deadline_hours'], spec.get('replications', 1),
+                                           spec.get('base_seed', 42), workers=args.workers, report=prune_report,
+                                           use_cache=not args.no_cache, **spec['halving'])
+        elif spec.get('prune', True) and spec.get('deadline_hours') is not None:
+            # Stored results count as the incumbent, so a resumed sweep prunes at least as hard
+            best = store.best()
+            sweep = run_pruned_sweep(configs, spec['deadline_hours'], spec.get('replications', 1),
+                                     spec.get('base_seed', 42), workers=args.workers, report=prune_report,
+                                     incumbent=best[2]['cost_per_item_mean'] if best else float('inf'),
+                                     use_cache=not args.no_cache)
+        else:
+            sweep = run_replicated_sweep(configs, spec.get('replications', 1), spec.get('base_seed', 42),
+                                         workers=args.workers, deadline_hours=spec.get('deadline_hours'),
+                                         use_cache=not args.no_cache)
+        for i, statistics in sweep:
+            store.add(indices[i], configs[i], statistics)
+            finished += 1
+            now = time.monotonic()
+            if now - last_report >= 10:
+                rate = finished / (now - started)
+                print(f"{len(done) + finished} stored, {rate:.1f} configurations/s", flush=True)
+                last_report = now
+    except KeyboardInterrupt:
+        print("Interrupted, run again to resume")
+        return 1
+    finally:
+        store.flush()
+        # Pruned and eliminated configs are settled too, a resumed sweep leaves them out
+        store.skip({indices[i]: status for i, status in prune_report.get('pruned', {}).items()})
+
+    print(f"{finished} configurations simulated in {time.monotonic() - started:.0f} s")
+    if 'rungs' in prune_report:
+        for count, items, seeds in prune_report['rungs']:
+            print(f"Halving rung: {count} configurations on {items} items x {seeds} seeds")
+        print(f"{prune_report['work']:.0%} of the simulation work of running every configuration in full")
+    elif prune_report:
+        print(f"Pre-screen skipped {prune_report['infeasible']} that cannot meet the deadline and "
+              f"{prune_report['dominated']} that cannot beat the best found")
+    best = store.best()
+    store.close()
+    if best is None:
+        print("No configuration met the deadline")
+        return 0
+    index, config, statistics = best
+    print(f"\n=====Best Configuration (#{index})=====\n")
+    for name in spec['grid']:
+        print(f"{name}: {config[name]}")
+    print(f"\nCost per Item: ${statistics['cost_per_item_mean']:,.2f} ± ${statistics['cost_per_item_ci']:,.2f}")
+    print(f"Total Cost: ${statistics['total_cost_mean']:,.2f}")
+    print(f"Run Time: {statistics['sim_time_mean']:.1f} hours")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,13 @@
-from .queue_tracker import QueueTracker
-from .wip_tracker import WIPTracker
+import numpy as np
+
+from .queue_tracker import QueueTracker, StreamingQueueTracker
+from .wip_tracker import WIPTracker, StreamingWIPTracker
 from .cost_tracker import CostTracker
+from .streaming import RunningStats, QuantileSketch
+from workflow import busy_key
+
+# Flow efficiency bands used by the plotter: Low, Medium, High, Very High
+EFFICIENCY_BINS = [0.0, 0.25, 0.5, 0.75, 1.0]
 
 class Metrics:
     def __init__(self, team):
@@ -14,12 +21,23 @@ class Metrics:
 
 
         # Additional metrics storage
-        self.utilisation = {'Developers_busy_time': 0.0, 'Testers_busy_time': 0.0, 'Business_Analysts_busy_time': 0.0}
+        workflow = team.workflow
+        self.utilisation = {busy_key(name): 0.0 for name in workflow.pool_names}
+        self.stage_busy_key = {name: busy_key(workflow.pool_names[pool])
+                               for name, pool in zip(workflow.stage_names, workflow.stage_pool)}
         self.completed_items = 0
+        self.met_deadline = True    # False when a deadline run was stopped early
 
         # Flow efficiency tracking
         self.item_times = []
 
+    def __getstate__(self):
+        # The team (and with it the simulation environment) is only needed
+        # while recording, leave it out so finished metrics can be pickled
+        state = self.__dict__.copy()
+        state['team'] = None
+        return state
+
     # Queue tracking delegations
     def record_arrival(self, stage_name, env):
         return self.queue_tracker.record_arrival(stage_name, env)
@@ -39,14 +57,8 @@ class Metrics:
 
     # Resource utilization
     def log_resource_utilisation(self, stage_name, start_time, end_time):
-        resource = self.team.stage_resources[stage_name]
         busy_time = end_time - start_time
-        if resource == self.team.developers:
-            self.utilisation['Developers_busy_time'] += busy_time
-        elif resource == self.team.business_analysts:
-            self.utilisation['Business_Analysts_busy_time'] += busy_time
-        elif resource == self.team.testers:
-            self.utilisation['Testers_busy_time'] += busy_time
+        self.utilisation[self.stage_busy_key[stage_name]] += busy_time
 
     # Flow efficiency helpers
     def item_exit(self, entry_time, active_time, env):
@@ -59,3 +71,47 @@ class Metrics:
             for lead, active in self.item_times
         ]
         return sum(efficiencies) / len(efficiencies) if efficiencies else 0.0
+
+    def efficiency_histogram(self):
+        # Item counts per EFFICIENCY_BINS band
+        efficiencies = [(active / lead) if lead > 0 else 0 for lead, active in self.item_times]
+        return np.histogram(efficiencies, bins=EFFICIENCY_BINS)[0]
+
+
+class StreamingMetrics(Metrics):
+    """Metrics with memory that stays constant however long the run.
+
+    Wait times, lead times and flow efficiencies go into online aggregators
+    (Welford mean/variance, P-squared quantiles, fixed-bin histogram) and the
+    WIP history into a downsampled trace of at most *trace_capacity* buckets.
+    The recording interface is unchanged; per-item lists such as
+    item_times and queue_tracker.wait_times are not kept.
+    """
+
+    def __init__(self, team, trace_capacity=2048, quantiles=(0.5, 0.9, 0.95)):
+        super().__init__(team)
+        stages = list(team.stage_resources.keys())
+        self.queue_tracker = StreamingQueueTracker(stages, quantiles)
+        self.wip_tracker = StreamingWIPTracker(trace_capacity)
+
+        self.item_times = None      # Not kept, see lead_times and efficiencies
+        self.lead_times = RunningStats()
+        self.lead_time_quantiles = QuantileSketch(quantiles)
+        self.efficiencies = RunningStats()
+        self.efficiency_counts = np.zeros(len(EFFICIENCY_BINS) - 1, dtype=int)
+
+    def item_exit(self, entry_time, active_time, env):
+        lead_time = env.now - entry_time
+        efficiency = (active_time / lead_time) if lead_time > 0 else 0
+        self.lead_times.add(lead_time)
+        self.lead_time_quantiles.add(lead_time)
+        self.efficiencies.add(efficiency)
+        if EFFICIENCY_BINS[0] <= efficiency <= EFFICIENCY_BINS[-1]:
+            band = min(np.searchsorted(EFFICIENCY_BINS, efficiency, side='right') - 1, len(self.efficiency_counts) - 1)
+            self.efficiency_counts[band] += 1
+
+    def get_flow_efficiency(self):
+        return self.efficiencies.mean
+
+    def efficiency_histogram(self):
+        return self.efficiency_counts.copy()
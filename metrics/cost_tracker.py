@@ -1,5 +1,17 @@
 # metrics/cost_tracker.py
 
+import numpy as np
+
+from workflow import pool_sizes
+
+# (headcount key, rate key) for each pool of the default workflow, the order
+# the array helpers use unless given a workflow's pool names
+COST_ROLES = [
+    ('num_developers', 'developers'),
+    ('num_testers', 'testers'),
+    ('num_business_analysts', 'business_analysts'),
+]
+
 class CostTracker:
     def __init__(self, config):
         self.config = config
@@ -9,16 +21,34 @@ class CostTracker:
         self.simulation_time = sim_time
 
     def compute_total_cost(self):
-        devs = self.config['num_developers']
-        testers = self.config['num_testers']
-        business_analysts = self.config['num_business_analysts']
-        dev_cost = self.config['costs']['developers']
-        tester_cost = self.config['costs']['testers']
-        business_analyst_cost = self.config['costs']['business_analysts']
-
-        total_cost = (
-            self.simulation_time * devs * dev_cost +
-            self.simulation_time * testers * tester_cost +
-            self.simulation_time * business_analysts * business_analyst_cost
-        )
-        return total_cost
+        # Every pool of the workflow is paid for the whole run, config['costs'] is per pool
+        costs = self.config['costs']
+        return sum(self.simulation_time * size * costs[pool] for pool, size in pool_sizes(self.config))
+
+
+# Costs never feed back into the simulation, so a table of finished runs can
+# be re-priced under any rates without simulating again. Columns are the
+# workflow's pools (P of them), in workflow order.
+
+def headcounts(configs):
+    # (R, P) headcounts, the configs sharing a workflow
+    return np.array([[size for _, size in pool_sizes(config)] for config in configs], dtype=float)
+
+
+def rates(costs, pools=None):
+    # (P,) rates from a config['costs'] dict, or (S, P) from a list of them.
+    # *pools* are the pool names, those of the default workflow if not given.
+    pools = pools or [role for _, role in COST_ROLES]
+    if isinstance(costs, dict):
+        return np.array([costs[pool] for pool in pools], dtype=float)
+    return np.array([[c[pool] for pool in pools] for c in costs], dtype=float)
+
+
+def hourly_burn(headcount, rate):
+    # Team cost per hour: (R,) for (P,) rates, (S, R) for (S, P) rate scenarios
+    return np.asarray(rate, dtype=float) @ np.asarray(headcount, dtype=float).T
+
+
+def compute_total_costs(simulation_times, headcount, rate):
+    # Vectorised CostTracker.compute_total_cost over R runs and S rate scenarios
+    return hourly_burn(headcount, rate) * np.asarray(simulation_times, dtype=float)
@@ -1,5 +1,7 @@
 # metrics/queue_tracker.py
 
+from .streaming import RunningStats, QuantileSketch
+
 class QueueTracker:
     def __init__(self, stages):
         self.wait_times = {stage: [] for stage in stages}
@@ -28,3 +30,23 @@ class QueueTracker:
     def queue_exit(self, stage_name, now):
         self.queue_update_area(stage_name, now)
         self.current_queue_length[stage_name] -= 1
+
+    def mean_wait(self, stage_name):
+        waits = self.wait_times[stage_name]
+        return sum(waits) / len(waits) if waits else 0.0
+
+
+class StreamingQueueTracker(QueueTracker):
+    # Same interface, but waits go into online aggregators instead of lists
+    def __init__(self, stages, quantiles=(0.5, 0.9, 0.95)):
+        super().__init__(stages)
+        self.wait_times = {stage: RunningStats() for stage in stages}
+        self.wait_quantiles = {stage: QuantileSketch(quantiles) for stage in stages}
+
+    def record_wait(self, stage_name, env, arrival_time):
+        wait = env.now - arrival_time
+        self.wait_times[stage_name].add(wait)
+        self.wait_quantiles[stage_name].add(wait)
+
+    def mean_wait(self, stage_name):
+        return self.wait_times[stage_name].mean
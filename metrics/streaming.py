@@ -0,0 +1,185 @@
+# metrics/streaming.py
+#
+# Online aggregators for the streaming metrics mode. Each one keeps a fixed
+# amount of state however many observations it sees.
+
+import math
+
+
+class RunningStats:
+    # Welford's online mean and variance
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def total(self):
+        return self.mean * self.count
+
+
+class P2Quantile:
+    # Jain & Chlamtac's P-squared estimate of the p-quantile, five markers
+    def __init__(self, p):
+        self.p = p
+        self.q = []                                     # Marker heights
+        self.n = [0, 1, 2, 3, 4]                        # Marker positions
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+        self.increment = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        q, n = self.q, self.n
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increment[i]
+
+        # Nudge the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    @property
+    def value(self):
+        if not self.q:
+            return 0.0
+        if len(self.q) < 5:
+            # Exact while the markers are still being filled
+            return self.q[min(len(self.q) - 1, int(round(self.p * (len(self.q) - 1))))]
+        return self.q[2]
+
+
+class QuantileSketch:
+    # A P2Quantile per requested quantile
+    def __init__(self, quantiles=(0.5, 0.9, 0.95)):
+        self.estimators = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, x):
+        for estimator in self.estimators.values():
+            estimator.add(x)
+
+    def quantiles(self):
+        return {p: estimator.value for p, estimator in self.estimators.items()}
+
+
+class TimeWeightedAverage:
+    # Average of a step function of time, e.g. WIP or a queue length
+    def __init__(self, start_time=0.0, value=0.0):
+        self.start_time = start_time
+        self.last_time = start_time
+        self.value = value
+        self.area = 0.0
+
+    def update(self, now, value):
+        self.area += self.value * (now - self.last_time)
+        self.last_time = now
+        self.value = value
+
+    def mean(self, until=None):
+        until = self.last_time if until is None else until
+        elapsed = until - self.start_time
+        if elapsed <= 0:
+            return self.value
+        return (self.area + self.value * (until - self.last_time)) / elapsed
+
+
+class DownsampledTrace:
+    """Fixed-size (time, value) trace that keeps the min/max envelope.
+
+    Points are grouped into buckets of 'span' consecutive points, each
+    remembering its first, lowest, highest and last point. When the buffer
+    is full neighbouring buckets are merged and the span doubles, so at most
+    *capacity* buckets (4 points each) are ever held.
+    """
+
+    def __init__(self, capacity=2048):
+        self.capacity = capacity
+        self.span = 1
+        self.buckets = []       # [first, low, high, last, count], points are (time, value)
+
+    def append(self, time, value):
+        point = (time, value)
+        if self.buckets and self.buckets[-1][4] < self.span:
+            bucket = self.buckets[-1]
+            if value < bucket[1][1]:
+                bucket[1] = point
+            if value > bucket[2][1]:
+                bucket[2] = point
+            bucket[3] = point
+            bucket[4] += 1
+            return
+
+        if len(self.buckets) == self.capacity:
+            self._merge()
+        self.buckets.append([point, point, point, point, 1])
+
+    def _merge(self):
+        merged = []
+        for i in range(0, len(self.buckets), 2):
+            pair = self.buckets[i:i + 2]
+            first, last = pair[0], pair[-1]
+            merged.append([
+                first[0],
+                min((b[1] for b in pair), key=lambda p: p[1]),
+                max((b[2] for b in pair), key=lambda p: p[1]),
+                last[3],
+                sum(b[4] for b in pair),
+            ])
+        self.buckets = merged
+        self.span *= 2
+
+    def points(self):
+        # Time-ordered points, exact until the first merge
+        out = []
+        for first, low, high, last, _ in self.buckets:
+            for point in sorted({first, low, high, last}):
+                if not out or out[-1] != point:
+                    out.append(point)
+        return out
+
+    def __len__(self):
+        return len(self.points())
@@ -1,5 +1,7 @@
 # metrics/wip_tracker.py
 
+from .streaming import DownsampledTrace, TimeWeightedAverage
+
 class WIPTracker:
     def __init__(self):
         self.wip_log = []       # List of time, wip tuples
@@ -8,3 +10,24 @@ class WIPTracker:
     def log_wip(self, env, delta):
         self.current_wip += delta
         self.wip_log.append((env.now, self.current_wip))
+
+
+class StreamingWIPTracker(WIPTracker):
+    # Bounded WIP history: a min/max preserving downsampled trace plus the
+    # time-weighted average and peak
+    def __init__(self, trace_capacity=2048):
+        self.current_wip = 0
+        self.trace = DownsampledTrace(trace_capacity)
+        self.average = TimeWeightedAverage()
+        self.peak_wip = 0
+
+    @property
+    def wip_log(self):
+        return self.trace.points()
+
+    def log_wip(self, env, delta):
+        self.current_wip += delta
+        self.trace.append(env.now, self.current_wip)
+        self.average.update(env.now, self.current_wip)
+        if self.current_wip > self.peak_wip:
+            self.peak_wip = self.current_wip
@@ -0,0 +1,9 @@
+from .sweep import run_sweep, evaluate_config, evaluate_batch, default_workers
+from .replications import run_replicated_sweep, replicate, expand_replications, summarise_replications
+from .what_if import results_arrays, reprice, best_config_index, pruned_could_win
+from .store import SweepStore
+from .prescreen import makespan_lower_bound, bottleneck, prescreen, run_pruned_sweep
+from .search import MonotoneSearch, pareto_frontier
+from .surrogate import SurrogateSearch, GaussianProcess
+from .halving import run_successive_halving, fidelity_schedule
+from .sensitivity import SensitivityAnalysis, default_factors
@@ -0,0 +1,86 @@
+# optimiser/halving.py
+#
+# Successive halving over a list of configs. Early rungs run every candidate
+# cheaply, with fewer work items and fewer seeds, and promote the cheapest
+# 1/eta to the next rung. Only the last rung runs at full fidelity, so the
+# ranking that picks the winner is always on full runs.
+#
+# A truncated run's makespan is scaled up by the ratio of the makespan lower
+# bounds at the full and truncated item counts, so the fill and drain of the
+# pipeline are not simply multiplied out. Hourly burn times that estimate gives
+# the cost per item to rank on.
+
+import math
+
+from metrics.cost_tracker import headcounts, rates
+from workflow import Workflow
+from .prescreen import makespan_lower_bound
+from .replications import run_replicated_sweep
+
+
+def fidelity_schedule(num_work_items, replications, rungs=3, eta=3, min_items=10):
+    # (work items, replications) per rung, cheapest first, the last at full fidelity
+    schedule = []
+    for rung in range(rungs):
+        shrink = eta ** (rungs - 1 - rung)
+        schedule.append((min(num_work_items, max(min_items, math.ceil(num_work_items / shrink))),
+                         max(1, math.ceil(replications / shrink))))
+    return schedule
+
+
+def run_successive_halving(configs, deadline_hours, replications=5, base_seed=42, workers=None, rungs=3, eta=3,
+                           slack=0.1, min_items=10, confidence=0.95, report=None, use_cache=True):
+    """Race *configs* through fidelity_schedule() rungs.
+
+    Configs whose makespan bound misses the deadline never run. After each
+    truncated rung a config only stays in if its estimated makespan is within
+    *slack* of the deadline, and then only the cheapest ceil(1/eta) of those
+    by estimated cost per item (at least one). Truncated runs are not cut off
+    at the deadline.
+
+    Yields (index, statistics) for the configs run at full fidelity. If given,
+    *report* is filled with: total, infeasible, evaluated, rungs (a list of
+    (configs, work items, replications)), work, the item-replications
+    simulated as a fraction of running every candidate at full fidelity, and
+    pruned, index -> 'infeasible' or 'eliminated' for every config dropped.
+    """
+    configs = list(configs)
+    if report is None:
+        report = {}
+    candidates = [i for i, config in enumerate(configs) if makespan_lower_bound(config) <= deadline_hours + 1e-9]
+    report.update(total=len(configs), infeasible=len(configs) - len(candidates), evaluated=0, rungs=[], work=0.0,
+                  pruned=dict.fromkeys(sorted(set(range(len(configs))) - set(candidates)), 'infeasible'))
+    if not candidates:
+        return
+
+    full_work = sum(configs[i]['num_work_items'] for i in candidates) * replications
+    pools = Workflow(configs[0]).pool_names
+    burn = (headcounts(configs) * rates([config['costs'] for config in configs], pools)).sum(axis=1)
+    for rung, (items, rung_replications) in enumerate(fidelity_schedule(
+            max(configs[i]['num_work_items'] for i in candidates), replications, rungs, eta, min_items)):
+        last = rung == rungs - 1
+        rung_configs = [configs[i] if last else dict(configs[i], num_work_items=min(items, configs[i]['num_work_items']))
+                        for i in candidates]
+        report['rungs'].append((len(candidates), items, rung_replications))
+        report['work'] += sum(config['num_work_items'] for config in rung_configs) * rung_replications / full_work
+        sweep = run_replicated_sweep(rung_configs, rung_replications, base_seed, workers,
+                                     deadline_hours if last else None, confidence, use_cache)
+        if last:
+            for k, statistics in sweep:
+                report['evaluated'] += 1
+                yield candidates[k], statistics
+            return
+
+        estimates = {}
+        for k, statistics in sweep:
+            i = candidates[k]
+            scale = makespan_lower_bound(configs[i]) / makespan_lower_bound(rung_configs[k])
+            makespan = statistics['sim_time_mean'] * scale
+            if makespan <= deadline_hours * (1 + slack):
+                estimates[i] = burn[i] * makespan / configs[i]['num_work_items']
+        keep = max(1, math.ceil(len(candidates) / eta))
+        promoted = sorted(estimates, key=lambda i: (estimates[i], i))[:keep]
+        report['pruned'].update((i, 'eliminated') for i in set(candidates) - set(promoted))
+        candidates = promoted
+        if not candidates:
+            return
@@ -0,0 +1,143 @@
+# optimiser/prescreen.py
+#
+# Analytical bounds for the delivery pipeline (the config's workflow, see
+# workflow.py), used to skip configurations before simulating them. Stages
+# take at least their minimum duration (the duration itself unless sampled,
+# see durations.py) and rework only ever adds work, so the failure-free route
+# at minimum durations gives provable lower bounds on the makespan:
+#
+#   - one item's route end to end,
+#   - WIP slots: a slot serves its items one after another, so some slot
+#     carries at least ceil(N / wip_limit) of the routes from WIP entry on,
+#     and no slot is taken before the first item reaches WIP,
+#   - each resource pool: it cannot start before the first item reaches it,
+#     needs work / headcount hours (and whole jobs per server), and the
+#     stages after its last job still have to run.
+#
+# Expected visits including rework and mean durations give the bottleneck
+# and throughput bound (asymptotic bound analysis) reported alongside.
+
+import math
+
+import numpy as np
+
+from workflow import Workflow, pool_sizes, STAGE, BRANCH
+from .replications import run_replicated_sweep
+
+
+def makespan_lower_bound(config, workflow=None):
+    # No run of *config* can finish sooner than this many hours
+    workflow = workflow or Workflow(config)
+    n = config['num_work_items']
+    route_stages = workflow.route_stages
+    route = [workflow.stage_min_duration[stage] for stage in route_stages]
+    route_time = sum(route)
+    before_wip = sum(route[:len(route) - len(workflow.wip_stages)])
+    bound = max(route_time, before_wip + math.ceil(n / config['wip_limit']) * (route_time - before_wip))
+
+    for pool, capacity in enumerate(workflow.pool_capacity):
+        steps = [i for i, stage in enumerate(route_stages) if workflow.stage_pool[stage] == pool]
+        jobs = [route[i] for i in steps if route[i] > 0]
+        if not jobs:
+            continue
+        head = sum(route[:steps[0]])
+        tail = sum(route[steps[-1] + 1:])
+        busy = max(n * sum(jobs) / capacity, math.ceil(n * len(jobs) / capacity) * min(jobs))
+        bound = max(bound, head + busy + tail)
+    return bound
+
+
+def expected_visits(config, workflow=None):
+    # Mean visits per item to each stage, rework included. Route stages come
+    # first, in route order.
+    workflow = workflow or Workflow(config)
+    names = workflow.stage_names
+    visits = {names[stage]: 0.0 for stage in workflow.route_stages}
+    weight, body_end = 1.0, -1
+    for op, kind in enumerate(workflow.op_kind):
+        if kind == BRANCH:
+            weight, body_end = workflow.op_prob[op], workflow.op_jump[op]
+        elif kind == STAGE:
+            name = names[workflow.op_stage[op]]
+            visits[name] = visits.get(name, 0.0) + (weight if op < body_end else 1.0)
+    return visits
+
+
+def bottleneck(config):
+    """Expected hours of work per item for each pool, per server.
+
+    Returns (pool, demand, throughput): the busiest pool, its demand, and
+    the items per hour no run can sustain beyond, from that pool and from
+    wip_limit items each spending the mean route time in the system.
+    """
+    workflow = Workflow(config)
+    visits = expected_visits(config, workflow)
+    duration = {name: workflow.stage_duration[stage] for stage, name in enumerate(workflow.stage_names)}
+    demand = [0.0] * len(workflow.pool_names)
+    for stage, count in visits.items():
+        pool = workflow.stage_pool[workflow.stage_index[stage]]
+        demand[pool] += count * duration[stage] / workflow.pool_capacity[pool]
+    busiest = int(np.argmax(demand))
+    route_time = sum(count * duration[stage] for stage, count in visits.items())
+    throughput = min(1 / demand[busiest] if demand[busiest] else math.inf,
+                     config['wip_limit'] / route_time if route_time else math.inf)
+    return workflow.pool_names[busiest], demand[busiest], throughput
+
+
+def lower_bound_cost_per_item(config, bound=None):
+    # Cost per item of a run finishing exactly at the makespan bound
+    bound = makespan_lower_bound(config) if bound is None else bound
+    burn = sum(size * config['costs'][pool] for pool, size in pool_sizes(config))
+    return bound * burn / config['num_work_items']
+
+
+def prescreen(configs, deadline_hours):
+    # Boolean mask of configs that provably cannot meet the deadline
+    return np.array([makespan_lower_bound(config) > deadline_hours + 1e-9 for config in configs], dtype=bool)
+
+
+def run_pruned_sweep(configs, deadline_hours, replications=1, base_seed=42, workers=None,
+                     confidence=0.95, rounds=8, incumbent=math.inf, report=None, use_cache=True):
+    """run_replicated_sweep over the configs the bounds cannot rule out.
+
+    Configs whose makespan bound misses the deadline are never run. The rest
+    are simulated in rounds, cheapest lower-bound cost per item first; once
+    that bound exceeds the cheapest mean cost per item found among configs
+    meeting the deadline (or *incumbent*, e.g. from an earlier run), every
+    remaining config is dominated and skipped. Costs come from each config's
+    'costs', so the pruning only holds for those rates.
+
+    Yields (index, statistics) for the configs run. If given, *report* is
+    filled with the counts: total, infeasible, dominated and evaluated, and
+    pruned, index -> 'infeasible' or 'dominated' for every config skipped.
+    """
+    configs = list(configs)
+    bounds = [makespan_lower_bound(config) for config in configs]
+    infeasible = [bound > deadline_hours + 1e-9 for bound in bounds]
+    lower_costs = [lower_bound_cost_per_item(config, bound) for config, bound in zip(configs, bounds)]
+    candidates = sorted((i for i in range(len(configs)) if not infeasible[i]), key=lambda i: (lower_costs[i], i))
+
+    if report is None:
+        report = {}
+    report.update(total=len(configs), infeasible=sum(infeasible), dominated=0, evaluated=0,
+                  pruned={i: 'infeasible' for i in range(len(configs)) if infeasible[i]})
+
+    batch_size = max(1, math.ceil(len(candidates) / rounds))
+    position = 0
+    while position < len(candidates):
+        batch = []
+        while position < len(candidates) and len(batch) < batch_size:
+            if lower_costs[candidates[position]] > incumbent:
+                break
+            batch.append(candidates[position])
+            position += 1
+        if not batch:
+            report['dominated'] = len(candidates) - position
+            report['pruned'].update((i, 'dominated') for i in candidates[position:])
+            return
+        for i, statistics in run_replicated_sweep([configs[index] for index in batch], replications, base_seed,
+                                                  workers, deadline_hours, confidence, use_cache):
+            report['evaluated'] += 1
+            if statistics['met_deadline'] and statistics['sim_time_mean'] <= deadline_hours:
+                incumbent = min(incumbent, statistics['cost_per_item_mean'])
+            yield batch[i], statistics
@@ -0,0 +1,83 @@
+# optimiser/replications.py
+
+import math
+from statistics import NormalDist, mean, stdev
+
+from .sweep import run_sweep
+
+# Summary fields reported with a confidence interval
+STATISTICS = ['sim_time', 'time_per_item', 'total_cost', 'cost_per_item']
+
+
+def replication_seeds(replications, base_seed=42):
+    # The first replication reuses the classic single-run seed
+    return [base_seed + r for r in range(replications)]
+
+
+def expand_replications(configs, replications, base_seed=42):
+    # One config copy per (config, seed), grouped by config
+    seeds = replication_seeds(replications, base_seed)
+    return [dict(config, seed=seed) for config in configs for seed in seeds]
+
+
+def t_critical(confidence, df):
+    # Two-sided Student t quantile, exact for df 1-2 and a Cornish-Fisher
+    # expansion of the normal quantile above that (within 1% from df 3)
+    p = 0.5 + confidence / 2
+    if df == 1:
+        return math.tan(math.pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / math.sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    return (z
+            + (z ** 3 + z) / (4 * df)
+            + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+            + (79 * z ** 9 + 776 * z ** 7 + 1482 * z ** 5 - 1920 * z ** 3 - 945 * z) / (92160 * df ** 4))
+
+
+def summarise_replications(summaries, confidence=0.95):
+    """Aggregate the run summaries of one config over its replications.
+
+    For each of STATISTICS gives '<name>_mean', '<name>_std' and
+    '<name>_ci' (half-width of the *confidence* interval on the mean).
+    met_deadline is True only if every replication met the deadline,
+    met_deadline_rate is the fraction that did.
+    """
+    n = len(summaries)
+    result = {'replications': n}
+    for name in STATISTICS:
+        values = [summary[name] for summary in summaries]
+        result[f'{name}_mean'] = mean(values)
+        result[f'{name}_std'] = stdev(values) if n > 1 else 0.0
+        result[f'{name}_ci'] = (t_critical(confidence, n - 1) * result[f'{name}_std'] / math.sqrt(n)
+                                if n > 1 else 0.0)
+    result['completed_mean'] = mean(summary['completed'] for summary in summaries)
+    result['met_deadline_rate'] = sum(summary['met_deadline'] for summary in summaries) / n
+    result['met_deadline'] = result['met_deadline_rate'] == 1.0
+    return result
+
+
+def run_replicated_sweep(configs, replications=10, base_seed=42, workers=None, deadline_hours=None,
+                         confidence=0.95, use_cache=True):
+    """Run every config for *replications* seeds across the process pool.
+
+    Yields (index, statistics) per config, in completion order, as soon as
+    all of its replications are back.
+    """
+    configs = list(configs)
+    runs = expand_replications(configs, replications, base_seed)
+    pending = {}
+    for run_index, summary in run_sweep(runs, workers=workers, deadline_hours=deadline_hours,
+                                        use_cache=use_cache):
+        index = run_index // replications
+        pending.setdefault(index, []).append(summary)
+        if len(pending[index]) == replications:
+            yield index, summarise_replications(pending.pop(index), confidence)
+
+
+def replicate(config, replications=10, base_seed=42, workers=None, deadline_hours=None, confidence=0.95):
+    # Statistics for a single config
+    for _, statistics in run_replicated_sweep([config], replications, base_seed, workers,
+                                              deadline_hours, confidence):
+        return statistics
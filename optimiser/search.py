@@ -0,0 +1,214 @@
+# optimiser/search.py
+#
+# Search the staffing grid instead of enumerating it. Completion time only
+# falls as headcount grows (more servers never make the non-preemptive
+# priority queues slower in practice), so along each line of the grid that
+# varies one headcount the configs meeting the deadline start at a threshold
+# that bisection finds in a few runs. Lines also bound each other: a line
+# with at least as many of every role is feasible wherever this one is, and
+# one with at most as many is infeasible wherever this one is.
+#
+# Each wave probes a set of mutually incomparable lines (so none of them
+# could have settled another) as one parallel run_replicated_sweep, and the
+# outcomes then narrow every comparable line. Every evaluated point is cached.
+
+import itertools
+import math
+
+from workflow import Workflow
+from .prescreen import makespan_lower_bound, lower_bound_cost_per_item
+from .replications import run_replicated_sweep
+
+
+def pareto_frontier(points):
+    """Indices of the points no other point beats on both coordinates.
+
+    *points* is a list of (time, cost) pairs, lower is better for both. The
+    frontier comes back ordered by time.
+    """
+    order = sorted(range(len(points)), key=lambda i: (points[i][0], points[i][1]))
+    frontier = []
+    best_cost = math.inf
+    for i in order:
+        if points[i][1] < best_cost:
+            frontier.append(i)
+            best_cost = points[i][1]
+    return frontier
+
+
+class MonotoneSearch:
+    """Threshold search along *axis* of *grid* (name -> sorted values).
+
+    run() returns a report dict; afterwards `evaluated` maps each simulated
+    grid point (a tuple of values in grid order) to (config, statistics).
+    *callback*, if given, is called with (point, statistics) as each arrives.
+    Headcount axes other than *axis* are used to share outcomes between lines.
+    """
+
+    def __init__(self, base_config, grid, deadline_hours, axis='num_developers', replications=1,
+                 base_seed=42, workers=None, use_cache=True, callback=None):
+        self.base_config = base_config
+        self.names = list(grid)
+        self.grid = {name: sorted(values) for name, values in grid.items()}
+        self.deadline_hours = deadline_hours
+        self.axis = axis
+        self.replications = replications
+        self.base_seed = base_seed
+        self.workers = workers
+        self.use_cache = use_cache
+        self.callback = callback
+        self.evaluated = {}
+        self.waves = 0
+
+        self.axis_values = self.grid[axis]
+        self.line_names = [name for name in self.names if name != axis]
+        size_keys = Workflow(base_config).pool_size_keys
+        self.monotone = [i for i, name in enumerate(self.line_names) if name in size_keys]
+        self.lines = list(itertools.product(*(self.grid[name] for name in self.line_names)))
+        # Lines each line covers (has at least the headcounts of), itself excluded
+        self.below = {line: [other for other in self.lines if other != line and self._covers(line, other)]
+                      for line in self.lines}
+        self.above = {line: [] for line in self.lines}
+        for line, others in self.below.items():
+            for other in others:
+                self.above[other].append(line)
+
+    def config(self, line, value):
+        settings = dict(zip(self.line_names, line), **{self.axis: value})
+        return dict(self.base_config, **settings)
+
+    def point(self, line, index):
+        settings = dict(zip(self.line_names, line), **{self.axis: self.axis_values[index]})
+        return tuple(settings[name] for name in self.names)
+
+    def feasible(self, statistics):
+        return statistics['met_deadline'] and statistics['sim_time_mean'] <= self.deadline_hours
+
+    def evaluate(self, probes):
+        # Simulate the (line, index) probes not seen before, in one sweep
+        todo = []
+        for line, index in probes:
+            point = self.point(line, index)
+            if point not in self.evaluated and point not in todo:
+                todo.append(point)
+        if not todo:
+            return
+        self.waves += 1
+        configs = [dict(self.base_config, **dict(zip(self.names, point))) for point in todo]
+        for i, statistics in run_replicated_sweep(configs, self.replications, self.base_seed, self.workers,
+                                                  self.deadline_hours, use_cache=self.use_cache):
+            self.evaluated[todo[i]] = (configs[i], statistics)
+            if self.callback is not None:
+                self.callback(todo[i], statistics)
+
+    def _covers(self, line, other):
+        # True if *line* has at least the headcounts of *other* and the same
+        # values on every other axis
+        for i, (a, b) in enumerate(zip(line, other)):
+            if i in self.monotone:
+                if a < b:
+                    return False
+            elif a != b:
+                return False
+        return True
+
+    def thresholds(self):
+        """Smallest feasible index on *axis* per line, len(values) if none.
+
+        Bisection with lo the first index not known infeasible and hi the
+        first known feasible. Indices below the analytical makespan bound are
+        infeasible without a run.
+        """
+        n = len(self.axis_values)
+        lo, hi = {}, {}
+        for line in self.lines:
+            lo[line] = next((k for k in range(n)
+                             if makespan_lower_bound(self.config(line, self.axis_values[k])) <= self.deadline_hours + 1e-9), n)
+            hi[line] = n
+
+        while True:
+            # Share what each line has learnt with the lines it bounds
+            for line in self.lines:
+                for other in self.below[line]:
+                    hi[line] = min(hi[line], hi[other])
+                for other in self.above[line]:
+                    lo[line] = max(lo[line], lo[other])
+                lo[line] = min(lo[line], hi[line])
+            open_lines = [line for line in self.lines if lo[line] < hi[line]]
+            if not open_lines:
+                return hi
+
+            # Widest brackets first, skipping lines comparable to one already
+            # in the wave since its result may settle them
+            open_lines.sort(key=lambda line: (-(hi[line] - lo[line]),
+                                              -len(self.below[line]) * len(self.above[line])))
+            wave = []
+            for line in open_lines:
+                if not any(other in self.below[line] or other in self.above[line] for other in wave):
+                    wave.append(line)
+            probes = [(line, (lo[line] + hi[line]) // 2) for line in wave]
+            self.evaluate(probes)
+            for line, mid in probes:
+                if self.feasible(self.evaluated[self.point(line, mid)][1]):
+                    hi[line] = mid
+                else:
+                    lo[line] = mid + 1
+
+    def frontier(self):
+        points = [point for point, (_, statistics) in self.evaluated.items() if self.feasible(statistics)]
+        frontier = pareto_frontier([(self.evaluated[point][1]['sim_time_mean'],
+                                     self.evaluated[point][1]['total_cost_mean']) for point in points])
+        return points, [points[i] for i in frontier]
+
+    def dominated(self, line, index, frontier):
+        # True if an evaluated point is at least as fast and as cheap as the
+        # makespan and cost lower bounds of this one, so it cannot be on the
+        # frontier or be the cheapest
+        config = self.config(line, self.axis_values[index])
+        time_bound = makespan_lower_bound(config)
+        cost_bound = lower_bound_cost_per_item(config, time_bound) * config['num_work_items']
+        for point in frontier:
+            statistics = self.evaluated[point][1]
+            if statistics['sim_time_mean'] <= time_bound and statistics['total_cost_mean'] <= cost_bound:
+                return True
+        return False
+
+    def run(self):
+        thresholds = self.thresholds()
+
+        # From each threshold walk up the axis while cost per item keeps
+        # falling, then try the top of the axis as the line's fastest point.
+        # Points the bounds show to be dominated are skipped.
+        n = len(self.axis_values)
+        walking = {line: (k, k) for line, k in thresholds.items() if k < n}   # next step, last evaluated
+        self.evaluate([(line, k) for line, (k, _) in walking.items()])
+        while walking:
+            _, frontier = self.frontier()
+            steps = {}
+            for line, (k, last) in walking.items():
+                k += 1
+                while k < n and self.dominated(line, k, frontier):
+                    k += 1
+                if k < n:
+                    steps[line] = (k, last)
+            self.evaluate([(line, k) for line, (k, _) in steps.items()])
+            walking = {}
+            for line, (k, last) in steps.items():
+                here = self.evaluated[self.point(line, last)][1]
+                above = self.evaluated[self.point(line, k)][1]
+                if self.feasible(above) and above['cost_per_item_mean'] < here['cost_per_item_mean']:
+                    walking[line] = (k, k)
+        _, frontier = self.frontier()
+        self.evaluate([(line, n - 1) for line, k in thresholds.items()
+                       if k < n and not self.dominated(line, n - 1, frontier)])
+
+        points, frontier = self.frontier()
+        best = min(points, key=lambda point: (self.evaluated[point][1]['cost_per_item_mean'], point), default=None)
+        return {
+            'grid_size': len(self.lines) * n,
+            'evaluated': len(self.evaluated),
+            'waves': self.waves,
+            'thresholds': {line: (self.axis_values[k] if k < n else None) for line, k in thresholds.items()},
+            'frontier': frontier,
+            'best': best,
+        }
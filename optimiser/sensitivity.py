@@ -0,0 +1,226 @@
+# optimiser/sensitivity.py
+#
+# Which inputs drive completion time and cost. A factor is a stage duration
+# ("durations.Develop") or any numeric config key ("test_failure_chance"),
+# varied over a (low, high) range. Each method builds its whole design up
+# front as a matrix of unit-cube samples, turns it into configs and runs them
+# all as one run_replicated_sweep across the process pool:
+#
+#   - one_at_a_time: each factor swept alone with the rest at base values,
+#     the swings behind a tornado plot.
+#   - morris: elementary effects along random one-step-at-a-time
+#     trajectories of a level grid (Morris 1991), mu* ranks the factors and
+#     sigma flags non-linear or interacting ones. r * (k + 1) runs.
+#   - sobol: first-order and total indices from Saltelli's A, B and AB_i
+#     matrices with the Saltelli 2010 and Jansen estimators, intervals by
+#     bootstrap over the rows. N * (k + 2) runs.
+#
+# Every design point runs with the same seeds and common random numbers, so
+# the differences between points come from the factors rather than from
+# fresh failure draws.
+
+import numpy as np
+
+from workflow import workflow_spec
+from .replications import run_replicated_sweep
+
+# Outputs analysed, each read from the '<name>_mean' statistic
+OUTPUTS = ['sim_time', 'cost_per_item']
+
+
+def default_factors(config, spread=0.5):
+    """Factor ranges around *config*: every non-zero fixed stage duration
+    and every failure chance key the workflow reads, each +/- *spread* of
+    its value (chances kept within [0, 0.99]).
+    """
+    factors = {}
+    for stage, duration in config['durations'].items():
+        if not isinstance(duration, dict) and duration > 0:
+            factors[f'durations.{stage}'] = (duration * (1 - spread), duration * (1 + spread))
+    for step in workflow_spec(config)['route']:
+        if isinstance(step, dict) and isinstance(step['fail'], str):
+            chance = config[step['fail']]
+            factors[step['fail']] = (max(0.0, chance * (1 - spread)), min(0.99, chance * (1 + spread)))
+    return factors
+
+
+def set_factor(config, name, value):
+    # Copy of *config* with factor *name* set, durations copied before editing
+    if name.startswith('durations.'):
+        return dict(config, durations=dict(config['durations'], **{name.split('.', 1)[1]: value}))
+    return dict(config, **{name: value})
+
+
+def morris_design(k, trajectories, levels, rng):
+    """(trajectories, k + 1, k) points on a *levels* grid of the unit cube
+    and the (trajectories, k) order the factors move in. Each step moves one
+    factor by delta = levels / (2 * (levels - 1)), up if it fits, else down.
+    """
+    delta = levels / (2 * (levels - 1))
+    grid = np.linspace(0, 1, levels)
+    points = np.empty((trajectories, k + 1, k))
+    order = np.empty((trajectories, k), dtype=np.int64)
+    for t in range(trajectories):
+        x = rng.choice(grid, size=k)
+        order[t] = rng.permutation(k)
+        points[t, 0] = x
+        for step, i in enumerate(order[t]):
+            x = x.copy()
+            x[i] += delta if x[i] + delta <= 1 + 1e-9 else -delta
+            points[t, step + 1] = x
+    return points, order
+
+
+def saltelli_design(k, samples, rng):
+    # A, B and the k AB_i matrices (A with column i from B), (k + 2, N, k)
+    a, b = rng.random((samples, k)), rng.random((samples, k))
+    ab = np.repeat(a[None], k, axis=0)
+    for i in range(k):
+        ab[i, :, i] = b[:, i]
+    return np.concatenate([a[None], b[None], ab])
+
+
+def sobol_indices(f_a, f_b, f_ab):
+    # First-order (Saltelli 2010) and total (Jansen) indices, f_ab is (k, N).
+    # Outputs are centred first: run times are large next to their spread
+    # and the first-order estimator's variance grows with the mean.
+    both = np.concatenate([f_a, f_b])
+    mean, variance = both.mean(), both.var()
+    f_a, f_b, f_ab = f_a - mean, f_b - mean, f_ab - mean
+    if variance == 0:
+        return np.zeros(len(f_ab)), np.zeros(len(f_ab))
+    first = (f_b * (f_ab - f_a)).mean(axis=1) / variance
+    total = 0.5 * ((f_a - f_ab) ** 2).mean(axis=1) / variance
+    return first, total
+
+
+class SensitivityAnalysis:
+    """Sensitivity of OUTPUTS to *factors* (name -> (low, high), default
+    default_factors()) around *base_config*.
+
+    Each method returns a report dict: method, factors, ranges, runs (the
+    simulations, replications included), base (outputs at the base config
+    where the design has it) and indices, output -> factor -> the method's
+    measures, factors ordered most influential first. *callback*, if given,
+    is called with (done, total) configs as results arrive.
+    """
+
+    def __init__(self, base_config, factors=None, replications=1, base_seed=42, workers=None,
+                 use_cache=True, seed=0, callback=None):
+        self.base_config = dict(base_config, common_random_numbers=True)
+        self.factors = factors or default_factors(base_config)
+        self.names = list(self.factors)
+        self.low = np.array([self.factors[name][0] for name in self.names], dtype=float)
+        self.high = np.array([self.factors[name][1] for name in self.names], dtype=float)
+        self.replications = replications
+        self.base_seed = base_seed
+        self.workers = workers
+        self.use_cache = use_cache
+        self.callback = callback
+        self.rng = np.random.default_rng(seed)
+
+    def config(self, unit):
+        # Config at a point of the unit cube, one coordinate per factor
+        config = self.base_config
+        for name, value in zip(self.names, self.low + np.asarray(unit) * (self.high - self.low)):
+            config = set_factor(config, name, float(value))
+        return config
+
+    def evaluate(self, configs):
+        # (len(configs), len(OUTPUTS)) output means, all configs in one sweep
+        results = np.empty((len(configs), len(OUTPUTS)))
+        done = 0
+        for i, statistics in run_replicated_sweep(configs, self.replications, self.base_seed, self.workers,
+                                                  use_cache=self.use_cache):
+            results[i] = [statistics[f'{name}_mean'] for name in OUTPUTS]
+            done += 1
+            if self.callback is not None:
+                self.callback(done, len(configs))
+        return results
+
+    def _report(self, method, runs, base, indices, key):
+        return {
+            'method': method,
+            'factors': self.names,
+            'ranges': dict(self.factors),
+            'runs': runs * self.replications,
+            'base': base,
+            'indices': {output: dict(sorted(measures.items(), key=lambda item: -item[1][key]))
+                        for output, measures in indices.items()},
+        }
+
+    def one_at_a_time(self, levels=5):
+        """Sweep each factor over *levels* values from low to high, the others
+        at their base values. Per factor: values, outputs (one per value),
+        low and high (the outputs at the ends) and swing, |high - low|.
+        """
+        configs = [self.base_config]
+        for name in self.names:
+            values = np.linspace(*self.factors[name], levels)
+            configs += [set_factor(self.base_config, name, float(value)) for value in values]
+        results = self.evaluate(configs)
+        base = dict(zip(OUTPUTS, results[0].tolist()))
+        indices = {output: {} for output in OUTPUTS}
+        for i, name in enumerate(self.names):
+            block = results[1 + i * levels:1 + (i + 1) * levels]
+            for j, output in enumerate(OUTPUTS):
+                indices[output][name] = {
+                    'values': np.linspace(*self.factors[name], levels).tolist(),
+                    'outputs': block[:, j].tolist(),
+                    'low': float(block[0, j]),
+                    'high': float(block[-1, j]),
+                    'swing': float(abs(block[-1, j] - block[0, j])),
+                }
+        return self._report('one_at_a_time', len(configs), base, indices, 'swing')
+
+    def morris(self, trajectories=10, levels=4):
+        """Morris screening. Per factor, from its elementary effects (the
+        change in the output per full low-to-high range): mu, mu_star (mean
+        absolute effect) and sigma.
+        """
+        k = len(self.names)
+        points, order = morris_design(k, trajectories, levels, self.rng)
+        results = self.evaluate([self.config(unit) for unit in points.reshape(-1, k)])
+        results = results.reshape(trajectories, k + 1, len(OUTPUTS))
+        effects = np.empty((trajectories, k, len(OUTPUTS)))
+        for t in range(trajectories):
+            for step, i in enumerate(order[t]):
+                move = points[t, step + 1, i] - points[t, step, i]
+                effects[t, i] = (results[t, step + 1] - results[t, step]) / move
+        indices = {output: {} for output in OUTPUTS}
+        for i, name in enumerate(self.names):
+            for j, output in enumerate(OUTPUTS):
+                ee = effects[:, i, j]
+                indices[output][name] = {
+                    'mu': float(ee.mean()),
+                    'mu_star': float(np.abs(ee).mean()),
+                    'sigma': float(ee.std(ddof=1)) if trajectories > 1 else 0.0,
+                }
+        return self._report('morris', trajectories * (k + 1), {}, indices, 'mu_star')
+
+    def sobol(self, samples=256, bootstrap=200, confidence=0.95):
+        """Sobol indices from *samples* rows per matrix. Per factor: first
+        (S1) and total (ST), each with a bootstrap *confidence* interval
+        half-width (first_ci, total_ci).
+        """
+        k = len(self.names)
+        design = saltelli_design(k, samples, self.rng)
+        results = self.evaluate([self.config(unit) for unit in design.reshape(-1, k)])
+        results = results.reshape(k + 2, samples, len(OUTPUTS))
+        tail = (1 - confidence) / 2
+        rows = self.rng.integers(0, samples, size=(bootstrap, samples))
+        indices = {output: {} for output in OUTPUTS}
+        for j, output in enumerate(OUTPUTS):
+            f_a, f_b, f_ab = results[0, :, j], results[1, :, j], results[2:, :, j]
+            first, total = sobol_indices(f_a, f_b, f_ab)
+            resampled = [sobol_indices(f_a[r], f_b[r], f_ab[:, r]) for r in rows]
+            first_ci = np.diff(np.quantile([s[0] for s in resampled], [tail, 1 - tail], axis=0), axis=0)[0] / 2
+            total_ci = np.diff(np.quantile([s[1] for s in resampled], [tail, 1 - tail], axis=0), axis=0)[0] / 2
+            for i, name in enumerate(self.names):
+                indices[output][name] = {
+                    'first': float(first[i]),
+                    'total': float(total[i]),
+                    'first_ci': float(first_ci[i]),
+                    'total_ci': float(total_ci[i]),
+                }
+        return self._report('sobol', (k + 2) * samples, {}, indices, 'total')
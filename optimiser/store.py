@@ -0,0 +1,93 @@
+# optimiser/store.py
+#
+# Append-only SQLite store for long sweeps. Each configuration's statistics
+# are written as they arrive, so an interrupted sweep can pick up from the
+# indices already stored. Configs the sweep skipped (pre-screen, halving) are
+# stored with the reason, so a resumed sweep skips them too.
+
+import json
+import os
+import sqlite3
+import time
+
+
+class SweepStore:
+    """Results of one sweep, keyed by the config's index in the grid.
+
+    The sweep spec is saved alongside the results; opening the store with a
+    different spec raises ValueError, since the stored indices would then
+    refer to other configurations. Writes are committed in batches at most
+    *commit_interval* seconds apart, an interruption loses at most that much.
+    """
+
+    def __init__(self, path, spec, commit_interval=1.0):
+        self.path = path
+        self.commit_interval = commit_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=60)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS results (
+            idx INTEGER PRIMARY KEY,
+            met_deadline INTEGER NOT NULL,
+            cost_per_item REAL NOT NULL,
+            config TEXT NOT NULL,
+            statistics TEXT NOT NULL)''')
+        self._db.execute('CREATE TABLE IF NOT EXISTS skipped (idx INTEGER PRIMARY KEY, status TEXT NOT NULL)')
+
+        spec_blob = json.dumps(spec, sort_keys=True)
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'spec'").fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('spec', ?)", (spec_blob,))
+        elif row[0] != spec_blob:
+            self._db.close()
+            raise ValueError(f"{path} holds results for a different sweep spec")
+        self._db.commit()
+
+        self._rows = []
+        self._last_commit = time.monotonic()
+
+    def completed(self):
+        return {idx for (idx,) in self._db.execute('SELECT idx FROM results')}
+
+    def skipped(self):
+        # index -> why the sweep skipped it ('infeasible', 'dominated', 'eliminated')
+        return dict(self._db.execute('SELECT idx, status FROM skipped'))
+
+    def skip(self, statuses):
+        # Record skipped configs, *statuses* maps index -> reason
+        self._db.executemany('INSERT OR REPLACE INTO skipped VALUES (?, ?)', statuses.items())
+        self._db.commit()
+
+    def __len__(self):
+        return self._db.execute('SELECT COUNT(*) FROM results').fetchone()[0] + len(self._rows)
+
+    def add(self, index, config, statistics):
+        self._rows.append((index, int(statistics['met_deadline']), statistics['cost_per_item_mean'],
+                           json.dumps(config), json.dumps(statistics)))
+        if time.monotonic() - self._last_commit >= self.commit_interval:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)', self._rows)
+            self._db.commit()
+            self._rows = []
+        self._last_commit = time.monotonic()
+
+    def best(self):
+        # (index, config, statistics) of the cheapest config per item that met
+        # the deadline, or None
+        self.flush()
+        row = self._db.execute('''SELECT idx, config, statistics FROM results WHERE met_deadline
+                                  ORDER BY cost_per_item, idx LIMIT 1''').fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), json.loads(row[2])
+
+    def close(self):
+        self.flush()
+        self._db.close()
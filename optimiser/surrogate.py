@@ -0,0 +1,251 @@
+# optimiser/surrogate.py
+#
+# Surrogate-guided search for grids too big to sweep. Cost is headcount times
+# rate times run time, so the only thing a simulation tells us about a config
+# is how much longer than its analytical makespan bound it runs. A Gaussian
+# process over the grid learns that ratio (in logs) from the runs so far, and
+# since feasibility and cost both follow from the run time, the expected
+# improvement on the best feasible cost per item has a closed form. Each
+# round proposes a batch (kriging believer: each pick is added to the model at
+# its predicted value before the next), so a round runs in parallel. The
+# search stops once the best expected improvement has been a negligible
+# fraction of the best cost found for two rounds running.
+
+import itertools
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+from metrics.cost_tracker import headcounts, rates, hourly_burn
+from workflow import Workflow
+from .prescreen import makespan_lower_bound
+from .replications import run_replicated_sweep
+
+# Candidate length scales (in units of an axis' range) and noise variances
+LENGTH_SCALES = [0.1, 0.2, 0.35, 0.6, 1.0, 2.0, 4.0]
+NOISES = [1e-4, 1e-3, 1e-2, 5e-2]
+
+# Floor (hours) on the makespan bound that run times and cost bounds scale by. It is
+# 0 when every stage can take no time at all (e.g. all lognormal or gamma).
+MIN_BOUND = 1e-3
+
+
+class GaussianProcess:
+    """GP regression with a squared exponential kernel, one length scale per
+    input column, a constant mean and signal variance from the data.
+
+    fit() picks the length scales and noise by coordinate ascent on the log
+    marginal likelihood over LENGTH_SCALES and NOISES.
+    """
+
+    def __init__(self, length_scales=None, noise=1e-3):
+        self.length_scales = length_scales
+        self.noise = noise
+
+    def _kernel(self, a, b, length_scales):
+        d = (a[:, None, :] - b[None, :, :]) / length_scales
+        return np.exp(-0.5 * np.einsum('ijk,ijk->ij', d, d))
+
+    def _factor(self, x, y, length_scales, noise):
+        # Cholesky factor and weights for unit-variance y, and the log likelihood
+        k = self._kernel(x, x, length_scales) + (noise + 1e-8) * np.eye(len(x))
+        try:
+            chol = np.linalg.cholesky(k)
+        except np.linalg.LinAlgError:
+            return None, None, -np.inf
+        alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, y))
+        likelihood = -0.5 * y @ alpha - np.log(np.diag(chol)).sum()
+        return chol, alpha, likelihood
+
+    def fit(self, x, y, optimise=True):
+        self.x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.mean = y.mean()
+        self.scale = y.std() or 1.0
+        self.y = (y - self.mean) / self.scale
+        if self.length_scales is None:
+            self.length_scales = np.full(self.x.shape[1], 0.6)
+        if optimise and len(self.x) > 2:
+            best = self._factor(self.x, self.y, self.length_scales, self.noise)[2]
+            for _ in range(2):
+                for column in range(self.x.shape[1]):
+                    for length_scale in LENGTH_SCALES:
+                        trial = self.length_scales.copy()
+                        trial[column] = length_scale
+                        likelihood = self._factor(self.x, self.y, trial, self.noise)[2]
+                        if likelihood > best:
+                            best, self.length_scales = likelihood, trial
+                for noise in NOISES:
+                    likelihood = self._factor(self.x, self.y, self.length_scales, noise)[2]
+                    if likelihood > best:
+                        best, self.noise = likelihood, noise
+        self.chol, self.alpha, _ = self._factor(self.x, self.y, self.length_scales, self.noise)
+        return self
+
+    def predict(self, x):
+        # Posterior mean and standard deviation of the latent function at x
+        k = self._kernel(np.asarray(x, dtype=float), self.x, self.length_scales)
+        mean = k @ self.alpha
+        v = np.linalg.solve(self.chol, k.T)
+        variance = np.maximum(1.0 - (v * v).sum(axis=0), 1e-12)
+        return self.mean + self.scale * mean, self.scale * np.sqrt(variance)
+
+
+def expected_improvement(mean, std, base_cost, log_slack, incumbent):
+    """EI of cost = base_cost * exp(y) below *incumbent*, counting only runs
+    with y <= log_slack (those meeting the deadline), for y ~ N(mean, std).
+
+    With no incumbent yet, the probability of meeting the deadline instead.
+    """
+    cdf = np.vectorize(NormalDist().cdf)
+    if not math.isfinite(incumbent):
+        return cdf((log_slack - mean) / std)
+    limit = np.minimum(np.log(incumbent / base_cost), log_slack)
+    z = (limit - mean) / std
+    return np.maximum(incumbent * cdf(z) - base_cost * np.exp(mean + std ** 2 / 2) * cdf(z - std), 0.0)
+
+
+class SurrogateSearch:
+    """Surrogate-guided search of *grid* (name -> values, any numeric config
+    keys) around *base_config* for the cheapest config meeting the deadline.
+
+    run() returns a report dict; afterwards `evaluated` maps each simulated
+    grid point (a tuple of values in grid order) to (config, statistics).
+    *callback*, if given, is called with (point, statistics) as each arrives.
+    """
+
+    def __init__(self, base_config, grid, deadline_hours, replications=1, base_seed=42, workers=None,
+                 use_cache=True, batch_size=None, initial=None, max_evaluations=None, tolerance=0.002, seed=0,
+                 callback=None):
+        self.base_config = base_config
+        self.names = list(grid)
+        self.grid = {name: sorted(values) for name, values in grid.items()}
+        self.deadline_hours = deadline_hours
+        self.replications = replications
+        self.base_seed = base_seed
+        self.workers = workers
+        self.use_cache = use_cache
+        self.callback = callback
+        self.batch_size = batch_size or max(workers or 1, 4)
+        self.initial = initial or 2 * len(self.names) + 2
+        self.max_evaluations = max_evaluations
+        self.tolerance = tolerance
+        self.rng = np.random.default_rng(seed)
+        self.evaluated = {}
+        self.waves = 0
+
+        self.points = list(itertools.product(*self.grid.values()))
+        self.configs = [self.config(point) for point in self.points]
+        # Grid coordinates scaled to [0, 1] per axis, the GP's inputs
+        low = np.array([values[0] for values in self.grid.values()], dtype=float)
+        span = np.array([(values[-1] - values[0]) or 1 for values in self.grid.values()], dtype=float)
+        self.x = (np.array(self.points, dtype=float) - low) / span
+        self.bounds = np.array([makespan_lower_bound(config) for config in self.configs])
+        self.scale = np.maximum(self.bounds, MIN_BOUND)
+        self.base_costs = (hourly_burn(headcounts(self.configs), rates(base_config['costs'], Workflow(base_config).pool_names)) * self.scale
+                           / np.array([config['num_work_items'] for config in self.configs]))
+        self.log_slack = np.log(deadline_hours / self.scale)
+        self.index = {point: i for i, point in enumerate(self.points)}
+
+    def config(self, point):
+        return dict(self.base_config, **dict(zip(self.names, point)))
+
+    def feasible(self, statistics):
+        return statistics['met_deadline'] and statistics['sim_time_mean'] <= self.deadline_hours
+
+    def evaluate(self, indices):
+        todo = [i for i in indices if self.points[i] not in self.evaluated]
+        if not todo:
+            return
+        self.waves += 1
+        for k, statistics in run_replicated_sweep([self.configs[i] for i in todo], self.replications,
+                                                  self.base_seed, self.workers, self.deadline_hours,
+                                                  use_cache=self.use_cache):
+            self.evaluated[self.points[todo[k]]] = (self.configs[todo[k]], statistics)
+            if self.callback is not None:
+                self.callback(self.points[todo[k]], statistics)
+
+    def observed(self, statistics, i):
+        # log(run time / bound), a run cut off at the deadline extrapolated
+        # from the items it finished
+        n = self.configs[i]['num_work_items']
+        time = statistics['sim_time_mean'] * n / max(statistics['completed_mean'], 0.5)
+        return math.log(max(time, self.scale[i]) / self.scale[i])
+
+    def incumbent(self):
+        costs = [statistics['cost_per_item_mean'] for _, statistics in self.evaluated.values()
+                 if self.feasible(statistics)]
+        return min(costs, default=math.inf)
+
+    def initial_design(self, candidates):
+        # Farthest-point sample of the candidates from a random start
+        chosen = [int(self.rng.choice(candidates))]
+        distance = np.linalg.norm(self.x[candidates] - self.x[chosen[0]], axis=1)
+        while len(chosen) < min(self.initial, len(candidates)):
+            k = int(np.argmax(distance))
+            chosen.append(int(candidates[k]))
+            distance = np.minimum(distance, np.linalg.norm(self.x[candidates] - self.x[candidates[k]], axis=1))
+        return chosen
+
+    def propose(self, candidates, incumbent):
+        # Up to batch_size candidates by expected improvement, each added to
+        # the model at its predicted value before the next is picked
+        observed = [self.index[point] for point in self.evaluated]
+        x = list(self.x[observed])
+        y = [self.observed(self.evaluated[self.points[i]][1], i) for i in observed]
+        model = GaussianProcess().fit(x, y)
+        batch, best_improvement = [], 0.0
+        candidates = np.array(candidates)
+        while len(batch) < self.batch_size and len(candidates):
+            mean, std = model.predict(self.x[candidates])
+            improvement = expected_improvement(mean, std, self.base_costs[candidates],
+                                               self.log_slack[candidates], incumbent)
+            k = int(np.argmax(improvement))
+            if not batch:
+                best_improvement = float(improvement[k])
+            i = int(candidates[k])
+            batch.append(i)
+            x.append(self.x[i])
+            y.append(float(mean[k]))
+            model = GaussianProcess(model.length_scales, model.noise).fit(x, y, optimise=False)
+            candidates = np.delete(candidates, k)
+        return batch, best_improvement
+
+    def run(self):
+        # The bounds rule out configs that cannot meet the deadline, or cost
+        # more per item than the best found, without a run
+        possible = np.flatnonzero(self.log_slack >= -1e-9)
+        history = []
+        stopped = 'exhausted'
+        quiet = 0
+        self.evaluate(self.initial_design(possible) if len(possible) else [])
+        while True:
+            incumbent = self.incumbent()
+            history.append((len(self.evaluated), incumbent))
+            candidates = [i for i in possible
+                          if self.points[i] not in self.evaluated and self.base_costs[i] < incumbent]
+            if not candidates:
+                break
+            if self.max_evaluations is not None and len(self.evaluated) >= self.max_evaluations:
+                stopped = 'budget'
+                break
+            batch, improvement = self.propose(candidates, incumbent)
+            quiet = quiet + 1 if math.isfinite(incumbent) and improvement < self.tolerance * incumbent else 0
+            if quiet == 2:
+                stopped = 'converged'
+                break
+            if self.max_evaluations is not None:
+                batch = batch[:self.max_evaluations - len(self.evaluated)]
+            self.evaluate(batch)
+
+        feasible = [point for point, (_, statistics) in self.evaluated.items() if self.feasible(statistics)]
+        best = min(feasible, key=lambda point: (self.evaluated[point][1]['cost_per_item_mean'], point), default=None)
+        return {
+            'grid_size': len(self.points),
+            'evaluated': len(self.evaluated),
+            'waves': self.waves,
+            'history': history,
+            'stopped': stopped,
+            'best': best,
+        }
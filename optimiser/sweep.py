@@ -0,0 +1,117 @@
+# optimiser/sweep.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+
+from engines.batch import simulate_batch
+from core import run_simulation, summarise_run
+from metrics.cost_tracker import CostTracker
+from result_cache import cached_summary
+from workflow import Workflow
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def evaluate_config(config, deadline_hours=None, use_cache=True):
+    # Runs in the worker process. Only the summary dict travels back, the
+    # full Metrics stay behind.
+    if use_cache:
+        return cached_summary(config, deadline_hours)
+    metrics, config_used, simulation_time = run_simulation(config=config, deadline_hours=deadline_hours)
+    return summarise_run(metrics, config_used, simulation_time)
+
+
+def _evaluate_chunk(chunk, deadline_hours=None, use_cache=True):
+    return [(index, evaluate_config(config, deadline_hours, use_cache)) for index, config in chunk]
+
+
+def _chunks(configs, chunksize):
+    chunk = []
+    for index, config in enumerate(configs):
+        chunk.append((index, config))
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_sweep(configs, workers=None, chunksize=None, deadline_hours=None, use_cache=True):
+    """Evaluate every config and yield (index, summary) pairs as they finish.
+
+    Results arrive in completion order, not submission order; the index is the
+    position of the config in *configs* so callers can restore the original
+    ordering. With a single worker everything runs in-process. Passing
+    *deadline_hours* stops each run early once it cannot meet the deadline,
+    check summary['met_deadline'] rather than the time for those. Results
+    are looked up in and added to the shared result cache unless *use_cache*
+    is False.
+    """
+    configs = list(configs)
+    workers = workers or default_workers()
+
+    if workers <= 1 or len(configs) <= 1:
+        for index, config in enumerate(configs):
+            yield index, evaluate_config(config, deadline_hours, use_cache)
+        return
+
+    if chunksize is None:
+        # Small enough that progress streams back and the last chunks balance
+        # across workers, large enough to amortise the pickling round trip.
+        chunksize = max(1, min(64, len(configs) // (workers * 4)))
+
+    chunks = _chunks(configs, chunksize)
+    evaluate_chunk = partial(_evaluate_chunk, deadline_hours=deadline_hours, use_cache=use_cache)
+    max_pending = workers * 2
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(evaluate_chunk, chunk))
+            if len(pending) >= max_pending:
+                break
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.add(executor.submit(evaluate_chunk, chunk))
+    finally:
+        # Also reached when the caller stops iterating early
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def evaluate_batch(configs, deadline_hours=None):
+    """Evaluate a slice of the grid in one lockstep NumPy pass.
+
+    Returns summaries in config order, shaped like evaluate_config's. The
+    batch engine matches the event engines statistically, not run for run.
+    Each run draws from config['seed'] (default 42).
+    """
+    configs = list(configs)
+    results = simulate_batch(configs, seeds=[config.get('seed', 42) for config in configs])
+    busy_keys = Workflow(configs[0]).busy_keys()
+    summaries = []
+    for k, config in enumerate(configs):
+        simulation_time = float(results['completion_time'][k])
+        completed = int(results['completed'][k])
+        cost_tracker = CostTracker(config)
+        cost_tracker.set_simulation_time(simulation_time)
+        total_cost = cost_tracker.compute_total_cost()
+        summaries.append({
+            "sim_time": simulation_time,
+            "completed": completed,
+            "met_deadline": deadline_hours is None or simulation_time <= deadline_hours,
+            "total_cost": total_cost,
+            "cost_per_item": total_cost / max(completed, 1),
+            "time_per_item": simulation_time / max(completed, 1),
+            "flow_efficiency": float(results['flow_efficiency'][k]),
+            "utilisation": {key: float(busy) for key, busy in zip(busy_keys, results['busy_time'][k])},
+        })
+    return summaries
@@ -0,0 +1,88 @@
+# optimiser/what_if.py
+#
+# Re-rank an evaluated grid under different hourly rates without simulating
+# again. Costs are linear in completion time for a fixed team, so the mean,
+# spread and confidence interval of every cost statistic are the time
+# statistics scaled by the team's hourly burn.
+
+import numpy as np
+
+from metrics.cost_tracker import headcounts, rates, hourly_burn
+from workflow import Workflow
+from .prescreen import makespan_lower_bound
+
+
+def results_arrays(configs, statistics):
+    """Collect replication statistics (summarise_replications) into arrays.
+
+    Only the simulated quantities are kept, nothing that depends on rates.
+    Configs the pre-screen skipped have None statistics; they get NaN times
+    and count as missing the deadline.
+    """
+    def column(name):
+        return np.array([stats[name] if stats is not None else np.nan for stats in statistics], dtype=float)
+
+    return {
+        'pools': Workflow(configs[0]).pool_names if configs else None,
+        'headcounts': headcounts(configs),
+        'wip_limit': np.array([config['wip_limit'] for config in configs]),
+        'num_work_items': np.array([config['num_work_items'] for config in configs]),
+        'makespan_lower_bound': np.array([makespan_lower_bound(config) for config in configs]),
+        'evaluated': np.array([stats is not None for stats in statistics], dtype=bool),
+        'sim_time_mean': column('sim_time_mean'),
+        'sim_time_ci': column('sim_time_ci'),
+        'time_per_item_mean': column('time_per_item_mean'),
+        'time_per_item_ci': column('time_per_item_ci'),
+        'completed_mean': column('completed_mean'),
+        'met_deadline': np.array([stats is not None and stats['met_deadline'] for stats in statistics], dtype=bool),
+    }
+
+
+def reprice(results, costs):
+    """Cost statistics for every evaluated config.
+
+    *costs* is a config['costs'] dict, a list of them, or an array of rates
+    in workflow pool order. Returns (R,) arrays, or (S, R) for S scenarios.
+    """
+    rate = rates(costs, results['pools']) if isinstance(costs, (dict, list)) else np.asarray(costs, dtype=float)
+    burn = hourly_burn(results['headcounts'], rate)
+    return {
+        'total_cost_mean': burn * results['sim_time_mean'],
+        'total_cost_ci': burn * results['sim_time_ci'],
+        'cost_per_item_mean': burn * results['time_per_item_mean'],
+        'cost_per_item_ci': burn * results['time_per_item_ci'],
+    }
+
+
+def feasible(results, deadline_hours):
+    return results['met_deadline'] & (results['sim_time_mean'] <= deadline_hours)
+
+
+def best_config_index(results, costs, deadline_hours):
+    """Index of the cheapest config per item that meets the deadline.
+
+    Ties go to the earliest config, as in the grid loop. Returns -1 when
+    nothing is feasible; an array of indices for several rate scenarios.
+    """
+    cost_per_item = np.where(feasible(results, deadline_hours),
+                             reprice(results, costs)['cost_per_item_mean'], np.inf)
+    best = cost_per_item.argmin(axis=-1)
+    return np.where(np.isfinite(cost_per_item.min(axis=-1)), best, -1)
+
+
+def pruned_could_win(results, costs, deadline_hours, pruned):
+    """Whether a config skipped as dominated might be optimal under *costs*.
+
+    Dominance pruning compares lower-bound costs under the rates of the run.
+    Under other rates a skipped config (one of the indices *pruned*, those
+    run_pruned_sweep reports as dominated) may undercut the best evaluated one, and
+    the sweep should be run again. Configs a search never visited are not
+    counted. Returns a bool, or an array of them for several scenarios.
+    """
+    rate = rates(costs, results['pools']) if isinstance(costs, (dict, list)) else np.asarray(costs, dtype=float)
+    skipped = np.zeros(len(results['evaluated']), dtype=bool)
+    skipped[list(pruned)] = True
+    skipped &= ~results['evaluated'] & (results['makespan_lower_bound'] <= deadline_hours + 1e-9)
+    lower_cost = hourly_burn(results['headcounts'], rate) * results['makespan_lower_bound'] / results['num_work_items']
+    best_cost = np.where(feasible(results, deadline_hours), reprice(results, rate)['cost_per_item_mean'], np.inf)
+    return np.where(skipped, lower_cost, np.inf).min(axis=-1) < best_cost.min(axis=-1)
@@ -0,0 +1,257 @@
+# result_cache.py
+#
+# Content-addressed cache for simulation results: an in-memory LRU tier in
+# front of a SQLite file shared by every process (the optimiser's workers
+# included). Entries are keyed by a hash of the canonical config, the seed,
+# the deadline and SIMULATION_VERSION. Hourly rates are not part of the key:
+# they never affect a run, costs are re-priced from the caller's config.
+
+import copy
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+
+from core import run_simulation, summarise_run
+from metrics.cost_tracker import CostTracker
+from simulator import SIMULATION_VERSION
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sim_cache', 'results.sqlite')
+
+# Config keys that cannot change the outcome of a run. Both event engines
+# give identical results, so a result from either answers for the other.
+IGNORED_KEYS = {'engine', 'seed', 'costs', 'instrument', 'profile_path', 'trace_path'}
+
+# Config keys asking the run to write a file (an event trace, a profile). A
+# config with one of them set is always simulated, so the file gets written,
+# and its result is still stored for everyone else.
+WRITE_KEYS = {'trace_path', 'profile_path'}
+
+
+def _canonical(value):
+    # 20 and 20.0 simulate identically, so hash them the same
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def cache_key(config, seed, deadline_hours=None):
+    payload = {
+        'config': _canonical({k: v for k, v in config.items() if k not in IGNORED_KEYS}),
+        'seed': seed,
+        'deadline_hours': _canonical(deadline_hours),
+        'version': SIMULATION_VERSION,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-tier store of run summaries and, optionally, pickled Metrics.
+
+    The memory tier holds up to *max_memory_entries* entries; the disk tier
+    evicts least recently used entries once it grows past *max_disk_bytes*.
+    Pass path=None for a memory-only cache.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_memory_entries=4096, max_disk_bytes=512 * 1024 ** 2):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.path = path
+        self._db = None
+        self._db_pid = None
+        self._disk_bytes = 0
+        self._puts = 0
+
+    def _connection(self):
+        # One connection per process, forked workers must not share the parent's
+        if self.path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute('''CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                metrics BLOB,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL)''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            self._db.commit()
+            self._db_pid = os.getpid()
+            self._disk_bytes = self._stored_bytes()
+        return self._db
+
+    def _stored_bytes(self):
+        return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key, with_metrics=False):
+        """Return {'summary': ..., 'metrics': ...} or None.
+
+        With *with_metrics* an entry stored without its Metrics is a miss.
+        """
+        entry = self.memory.get(key)
+        if entry is not None and (not with_metrics or entry['metrics'] is not None):
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        db = self._connection()
+        if db is not None:
+            column = 'metrics' if with_metrics else 'NULL'
+            row = db.execute(f'SELECT summary, {column} FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None and (not with_metrics or row[1] is not None):
+                db.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+                db.commit()
+                entry = {'summary': json.loads(row[0]),
+                         'metrics': pickle.loads(row[1]) if row[1] is not None else None}
+                self._remember(key, entry)
+                self.hits += 1
+                return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key, summary, metrics=None):
+        self._remember(key, {'summary': summary, 'metrics': metrics})
+
+        db = self._connection()
+        if db is None:
+            return
+        summary_blob = json.dumps(summary)
+        metrics_blob = pickle.dumps(metrics, protocol=pickle.HIGHEST_PROTOCOL) if metrics is not None else None
+        size = len(summary_blob) + (len(metrics_blob) if metrics_blob is not None else 0)
+        if metrics_blob is None:
+            # Keep a previously stored trace for the same key
+            db.execute('''INSERT INTO results (key, summary, metrics, size, accessed) VALUES (?, ?, NULL, ?, ?)
+                          ON CONFLICT(key) DO UPDATE SET summary = excluded.summary, accessed = excluded.accessed''',
+                       (key, summary_blob, size, time.time()))
+        else:
+            db.execute('INSERT OR REPLACE INTO results (key, summary, metrics, size, accessed) VALUES (?, ?, ?, ?, ?)',
+                       (key, summary_blob, metrics_blob, size, time.time()))
+        db.commit()
+
+        # Other processes write to the same file, resync the running total now and then
+        self._puts += 1
+        self._disk_bytes = self._stored_bytes() if self._puts % 1000 == 0 else self._disk_bytes + size
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict(db)
+
+    def _evict(self, db):
+        total = self._stored_bytes()
+        while total > self.max_disk_bytes:
+            rows = db.execute('SELECT key, size FROM results ORDER BY accessed LIMIT 256').fetchall()
+            if not rows:
+                break
+            freed = []
+            for key, size in rows:
+                freed.append((key,))
+                total -= size
+                if total <= self.max_disk_bytes:
+                    break
+            db.executemany('DELETE FROM results WHERE key = ?', freed)
+            db.commit()
+        self._disk_bytes = total
+
+    def clear(self):
+        self.memory.clear()
+        db = self._connection()
+        if db is not None:
+            db.execute('DELETE FROM results')
+            db.commit()
+            self._disk_bytes = 0
+
+
+_default_cache = None
+
+
+def default_cache():
+    # Shared per-process cache on DEFAULT_PATH, created on first use
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def _priced(summary, config):
+    # Summary with its costs worked out from config['costs']
+    cost_tracker = CostTracker(config)
+    cost_tracker.set_simulation_time(summary['sim_time'])
+    total_cost = cost_tracker.compute_total_cost()
+    return dict(summary, total_cost=total_cost, cost_per_item=total_cost / max(summary['completed'], 1))
+
+
+def _writes_files(config):
+    return any(config.get(key) for key in WRITE_KEYS if key != 'profile_path' or config.get('instrument'))
+
+
+def cached_summary(config, deadline_hours=None, cache=None):
+    """Summary of run_simulation(config, deadline_hours=...), from cache if possible.
+
+    A complete run that finished in time answers any later deadline, being
+    the same run. One that finished late does not: a deadline run stops early
+    and reports its partial run, which only the deadline run itself gives.
+    """
+    cache = cache or default_cache()
+    seed = config.get('seed', 42)
+
+    full_key = cache_key(config, seed)
+    writes_files = _writes_files(config)
+    entry = None if writes_files else cache.get(full_key)
+    if entry is not None and (deadline_hours is None or entry['summary']['sim_time'] <= deadline_hours):
+        return _priced(entry['summary'], config)
+
+    deadline_key = cache_key(config, seed, deadline_hours) if deadline_hours is not None else None
+    if deadline_key is not None and not writes_files:
+        entry = cache.get(deadline_key)
+        if entry is not None:
+            return _priced(entry['summary'], config)
+
+    metrics, config_used, simulation_time = run_simulation(config=config, deadline_hours=deadline_hours)
+    summary = summarise_run(metrics, config_used, simulation_time)
+    # A run that met its deadline is identical to the unbounded run
+    cache.put(full_key if summary['met_deadline'] else deadline_key, summary)
+    return summary
+
+
+def _priced_metrics(metrics, config):
+    # Shallow copy with its own CostTracker for config['costs']. The cached
+    # Metrics are shared by every caller (and Streamlit session), so they are
+    # never changed in place.
+    metrics = copy.copy(metrics)
+    cost_tracker = CostTracker(config)
+    cost_tracker.set_simulation_time(metrics.cost_tracker.simulation_time)
+    metrics.cost_tracker = cost_tracker
+    return metrics
+
+
+def cached_simulation(config, cache=None):
+    # Drop-in for run_simulation(config=config) that also caches the Metrics
+    cache = cache or default_cache()
+    key = cache_key(config, config.get('seed', 42))
+    entry = None if _writes_files(config) else cache.get(key, with_metrics=True)
+    if entry is not None:
+        # The stored run may have been priced with other rates
+        return _priced_metrics(entry['metrics'], config), config, entry['summary']['sim_time']
+
+    metrics, config_used, simulation_time = run_simulation(config=config)
+    cache.put(key, summarise_run(metrics, config_used, simulation_time), metrics)
+    return _priced_metrics(metrics, config_used), config_used, simulation_time
@@ -1,7 +1,22 @@
 import simpy
 import random
-from metrics import Metrics
+import numpy as np
+from durations import DurationSampler, draw_durations, duration_stream
+from metrics import Metrics, StreamingMetrics
 from metrics.cost_tracker import CostTracker
+from engines.heap import HeapEngine, Pool
+from instrumentation import Instrumentation
+from event_trace import TraceRecorder, ENTER, START, FINISH, WIP_IN, WIP_OUT, REWORK
+from workflow import Workflow, STAGE, BRANCH, WIP_ENTER
+
+ENGINES = ('simpy', 'heap')
+
+# How work items enter the simulation, see Simulator.run_simulator
+ARRIVAL_MODES = ('upfront', 'backlog', 'open')
+
+# Bump whenever a change alters simulation results, cached results from older
+# versions are then ignored (see result_cache.py)
+SIMULATION_VERSION = 4
 
 class Team:
     def __init__(self, env, config, sim):
@@ -9,99 +24,267 @@ class Team:
         self.config = config
         self.sim = sim
         self.cost_tracker = CostTracker(config)
-        self.developers = simpy.PriorityResource(env, capacity=config['num_developers'])
-        self.testers = simpy.PriorityResource(env, capacity=config['num_testers'])
-        self.business_analysts = simpy.PriorityResource(env, capacity=config['num_business_analysts'])
-        self.stage_resources = {
-            'Backlog': self.developers,
-            'Develop': self.developers,
-            'Smoke_Test': self.business_analysts,
-            'Test': self.testers,
-            'Rework': self.developers,
-            'ART': self.developers,
-            'Release': self.developers
-        }
-        self.stage_priorities = {
-            'Release': 0,
-            'ART': 1,
-            'Rework': 2,
-            'Test': 3,
-            'Smoke_Test': 4,
-            'Develop': 5,
-            'Backlog': 6
-        }
+        self.workflow = workflow = sim.workflow
+        resource = Pool if isinstance(env, HeapEngine) else simpy.PriorityResource
+        self.pools = [resource(env, capacity=capacity) for capacity in workflow.pool_capacity]
+        # Name-keyed views for the metrics and instrumentation, the engines use the tables
+        self.stage_resources = {name: self.pools[pool] for name, pool in zip(workflow.stage_names, workflow.stage_pool)}
+        self.stage_priorities = dict(zip(workflow.stage_names, workflow.stage_priority))
 
 class WorkItem:
-    def __init__(self, env, team, config, metrics):
-        self.env = env
-        self.team = team
-        self.config = config
-        
-        self.metrics = metrics
-        self.active_time = 0
-        self.action = env.process(self.run_workflow())
-
-    def process_stage(self, stage_name, duration):
-        resource = self.team.stage_resources[stage_name]
-        priority = self.team.stage_priorities[stage_name]
-        
-        arrival = self.metrics.record_arrival(stage_name, self.env)
-        self.metrics.queue_enter(stage_name, self.env.now)
-        
-        with resource.request(priority=priority) as req:
-            yield req
-            start_time = self.env.now
-            self.metrics.record_wait(stage_name, self.env, arrival)
-            self.metrics.queue_exit(stage_name, self.env.now)
-            
-            yield self.env.timeout(duration)
-            self.metrics.log_resource_utilisation(stage_name, start_time, self.env.now)
-            self.active_time += duration if stage_name != 'Backlog' else 0
+    # Slotted, and holding only its own state: the env, team, metrics and
+    # workflow tables are shared through the simulator
+    __slots__ = ('sim', 'index', 'active_time', 'entry_time', 'action')
 
-    def run_workflow(self):
-        cfg = self.config['durations']
-        yield from self.process_stage('Backlog', cfg['Backlog'])
+    def __init__(self, sim, index=0):
+        self.sim = sim
+        self.index = index  # Creation order, selects this item's common random numbers
+        self.active_time = 0
+        self.entry_time = 0
+        self.action = sim.env.process(self.run_workflow())
 
-        yield self.team.sim.wip.put(1)  #Wait here if WIP limit is reached
-        self.metrics.log_wip(self.env, +1)
-        self.entry_time = self.env.now
-        
+    def process_stage(self, stage, op):
+        sim = self.sim
+        env = sim.env
+        metrics = sim.metrics
+        workflow = sim.workflow
+        stage_name = workflow.stage_names[stage]
+        resource = sim.team.pools[workflow.stage_pool[stage]]
 
-        yield from self.process_stage('Develop', cfg['Develop'])
-        yield from self.process_stage('Smoke_Test', cfg['Smoke_Test'])
+        arrival = metrics.record_arrival(stage_name, env)
+        metrics.queue_enter(stage_name, env.now)
+        if sim.trace is not None:
+            sim.trace.record(ENTER, self.index, stage, env.now)
 
-        if random.random() < self.config['smoke_test_failure_chance']:
-            yield from self.process_stage('Rework', cfg['Rework'])
-            yield from self.process_stage('Smoke_Test', cfg['Smoke_Test'])
+        with resource.request(priority=workflow.stage_priority[stage]) as req:
+            yield req
+            start_time = env.now
+            if sim.duration_draws is not None:
+                duration = float(sim.duration_draws[self.index, op])
+            else:
+                draw = sim.draw_duration[stage]
+                duration = workflow.stage_duration[stage] if draw is None else draw()
+            if sim.deadline is not None:
+                sim.add_remaining_work(stage, -workflow.stage_min_duration[stage])
+            metrics.record_wait(stage_name, env, arrival)
+            metrics.queue_exit(stage_name, env.now)
+            if sim.trace is not None:
+                sim.trace.record(START, self.index, stage, env.now)
 
-        yield from self.process_stage('Test', cfg['Test'])
+            yield env.timeout(duration)
+            metrics.log_resource_utilisation(stage_name, start_time, env.now)
+            if workflow.stage_active[stage]:
+                self.active_time += duration
+            if sim.trace is not None:
+                sim.trace.record(FINISH, self.index, stage, env.now)
 
-        if random.random() < self.config['test_failure_chance']:
-            yield from self.process_stage('Rework', cfg['Rework'])
-            yield from self.process_stage('Test', cfg['Test'])
+    def failed(self, branch, chance):
+        draws = self.sim.failure_draws
+        if draws is None:
+            return self.sim.rng.random() < chance
+        return draws[self.index, branch] < chance
 
-        yield from self.process_stage('ART', cfg['ART'])
-        yield from self.process_stage('Release', cfg['Release'])
-        self.metrics.log_wip(self.env, -1)
-        self.metrics.completed_items += 1
-        self.metrics.item_exit(self.entry_time, self.active_time, self.env)
-        yield self.team.sim.wip.get(1)  # Release WIP slot
+    def run_workflow(self):
+        # Steps through the compiled route, see workflow.py
+        sim = self.sim
+        workflow = sim.workflow
+        op_kind = workflow.op_kind
+        pc = 0
+        while True:
+            kind = op_kind[pc]
+            if kind == STAGE:
+                yield from self.process_stage(workflow.op_stage[pc], pc)
+                pc += 1
+            elif kind == BRANCH:
+                if self.failed(workflow.op_branch[pc], workflow.op_prob[pc]):
+                    if sim.trace is not None:
+                        sim.trace.record(REWORK, self.index, workflow.op_branch[pc], sim.env.now)
+                    if sim.deadline is not None:
+                        for stage in workflow.op_rework[pc]:
+                            sim.add_remaining_work(stage, workflow.stage_min_duration[stage])
+                    pc += 1
+                else:
+                    pc = workflow.op_jump[pc]
+            elif kind == WIP_ENTER:
+                yield sim.wip.put(1)  #Wait here if WIP limit is reached
+                if sim.ahead is not None:
+                    sim.ahead.get(1)  # Lets the backlog source release another item
+                sim.metrics.log_wip(sim.env, +1)
+                self.entry_time = sim.env.now
+                if sim.trace is not None:
+                    sim.trace.record(WIP_IN, self.index, -1, sim.env.now)
+                pc += 1
+            else:
+                sim.metrics.log_wip(sim.env, -1)
+                sim.metrics.completed_items += 1
+                sim.metrics.item_exit(self.entry_time, self.active_time, sim.env)
+                if sim.trace is not None:
+                    sim.trace.record(WIP_OUT, self.index, -1, sim.env.now)
+                yield sim.wip.get(1)  # Release WIP slot
+                return
 
 class Simulator:
-    def __init__(self, config):
-        self.env = simpy.Environment()
+    def __init__(self, config, seed=None):
+        # "engine": "heap" swaps SimPy for the specialised event loop in
+        # engines/heap.py, which gives identical results for the same seed
+        engine = config.get('engine', 'simpy')
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+        self.env = HeapEngine() if engine == 'heap' else simpy.Environment()
         self.config = config
+        self.arrival_mode = config.get('arrival_mode', 'upfront')
+        if self.arrival_mode not in ARRIVAL_MODES:
+            raise ValueError(f"Unknown arrival_mode '{self.arrival_mode}', expected one of {ARRIVAL_MODES}")
+
+        # Each simulator draws from its own stream so runs never share state
+        self.seed = seed if seed is not None else config.get('seed')
+        # Pools, stages and route compiled to tables once, see workflow.py
+        self.workflow = Workflow(config)
+        self.rng = random.Random(self.seed)
+        if self.arrival_mode == 'open':
+            # Separate stream so arrival times don't shift the failure draws
+            self.arrival_rng = random.Random(self.rng.getrandbits(64))
+
+        # Common random numbers: every item's failure draws made up front from
+        # the seed, so item i fails the same way under any staffing or WIP
+        # limit and neighbouring configs differ only by their own effect. The
+        # layout matches engines/batch.py, which always works this way.
+        self.failure_draws = None
+        if config.get('common_random_numbers', False):
+            self.failure_draws = np.random.default_rng(self.seed).random((config['num_work_items'],
+                                                                           self.workflow.num_branches))
+        # Sampled stage durations (see durations.py) come from their own
+        # stream, drawn in blocks; draw_duration[stage] is None for fixed stages.
+        # With common random numbers they are drawn up front instead, per item
+        # and route op in duration_draws, laid out as engines/batch.py does.
+        self.draw_duration = [None] * len(self.workflow.stage_names)
+        self.duration_draws = None
+        if self.workflow.sampled and self.failure_draws is not None:
+            self.duration_draws = draw_durations(self.workflow, duration_stream(self.seed),
+                                                 (config['num_work_items'],))
+        elif self.workflow.sampled:
+            self.draw_duration = DurationSampler(self.workflow.stage_distribution,
+                                                 np.random.default_rng(self.rng.getrandbits(64))).draw
         self.team = Team(self.env, config, sim=self)
-        self.metrics = Metrics(self.team)
+        if config.get('streaming_metrics', False):
+            # Constant-memory aggregates instead of per-event lists
+            self.metrics = StreamingMetrics(self.team, trace_capacity=config.get('trace_capacity', 2048))
+        else:
+            self.metrics = Metrics(self.team)
         self.cost_tracker = CostTracker(config)
 
         self.metrics.cost_tracker = self.cost_tracker
-        self.wip = simpy.Container(self.env, init=0, capacity=config["wip_limit"])
+        # The heap engine keeps its own WIP counter
+        self.wip = None if engine == 'heap' else simpy.Container(self.env, init=0, capacity=config["wip_limit"])
+        # Released items not yet holding a WIP slot, see backlog_source
+        self.ahead = None
+        if engine != 'heap' and self.arrival_mode == 'backlog':
+            self.ahead = simpy.Container(self.env, init=0, capacity=config["wip_limit"])
+
+        # "instrument": true collects counters and timings for the run, see
+        # instrumentation.py; off by default and then free
+        self.instrumentation = None
+        if config.get('instrument', False):
+            self.instrumentation = Instrumentation(self, profile_path=config.get('profile_path'))
+
+        # "trace_path" writes every event of the run to a binary trace there
+        # ("{seed}" is replaced by the seed), see event_trace.py
+        self.trace = None
+        if config.get('trace_path'):
+            self.trace = TraceRecorder(config['trace_path'].format(seed=self.seed))
+
+        # Deadline mode, see run_simulator
+        self.deadline = None
+        self.deadline_missed = False
+        # Reported run time, see _run_simulator
+        self.simulation_time = None
+        self.remaining_work = []
+
+    def add_remaining_work(self, stage, hours):
+        # Work not yet started on a resource pool. Whatever happens next, the
+        # pool cannot finish it before now + work / capacity, so once that is
+        # past the deadline the run can stop early.
+        pool = self.workflow.stage_pool[stage]
+        self.remaining_work[pool] += hours
+        if self.env.now + self.remaining_work[pool] / self.team.pools[pool].capacity > self.deadline + 1e-9:
+            self.deadline_missed = True
+
+    def interarrival_time(self):
+        rate = self.config['arrival_rate']  # Items per hour
+        if self.config.get('arrival_distribution', 'exponential') == 'fixed':
+            return 1 / rate
+        return self.arrival_rng.expovariate(rate)
+
+    def backlog_source(self, num_items):
+        # Keep at most wip_limit released items short of a WIP slot, so only
+        # about twice the WIP limit exist at any time. Items take their slot
+        # themselves at the route's WIP op, as in the other modes, and the
+        # ones queued for it keep WIP topped up as 'upfront' would.
+        for index in range(num_items):
+            yield self.ahead.put(1)
+            WorkItem(self, index)
+
+    def open_source(self, num_items):
+        # Open system, items arrive at arrival_rate whether or not there is room
+        for index in range(num_items):
+            WorkItem(self, index)
+            if index < num_items - 1:
+                yield self.env.timeout(self.interarrival_time())
+
+    def run_simulator(self, deadline=None):
+        """Run until every work item is released.
+
+        arrival_mode picks how the num_work_items items enter: 'upfront' (all
+        at t=0, the default), 'backlog' (released as items take WIP slots,
+        at most wip_limit short of one) or 'open' (at arrival_rate per hour, exponential or 'fixed' gaps
+        per arrival_distribution).
+
+        With a *deadline* (hours) the run stops as soon as the clock passes it,
+        or earlier once the work left provably cannot finish in time. The
+        metrics then hold the partial run, metrics.met_deadline is False and
+        sim.simulation_time is the deadline (else it is the clock at the end).
+
+        With "instrument" in the config, sim.instrumentation.report() gives
+        event counts and timings afterwards.
+        """
+        if self.instrumentation is not None:
+            self.instrumentation.run(self._run_simulator, deadline)
+        else:
+            self._run_simulator(deadline)
+
+    def _run_simulator(self, deadline):
+        if deadline is not None:
+            self.deadline = deadline
+            self.remaining_work = [0.0] * len(self.team.pools)
+            for stage in self.workflow.route_stages:
+                self.add_remaining_work(stage, self.config['num_work_items'] * self.workflow.stage_min_duration[stage])
+
+        num_items = self.config['num_work_items']
+        if isinstance(self.env, HeapEngine):
+            self.env.add_work_items(self, num_items, self.arrival_mode)
+        elif self.arrival_mode == 'backlog':
+            self.env.process(self.backlog_source(num_items))
+        elif self.arrival_mode == 'open':
+            self.env.process(self.open_source(num_items))
+        else:
+            for index in range(num_items):
+                WorkItem(self, index)
 
+        if deadline is None:
+            self.env.run()
+        else:
+            env = self.env
+            while not self.deadline_missed and env.peek() <= deadline:
+                env.step()
+            if env.peek() != float('inf'):
+                self.deadline_missed = True
+            self.metrics.met_deadline = not self.deadline_missed
 
-    def run_simulator(self):
-        for _ in range(self.config['num_work_items']):
-            WorkItem(self.env, self.team, self.config, self.metrics)
-        self.env.run()
         total_time = self.env.now
-        self.metrics.cost_tracker.set_simulation_time(total_time)
\ No newline at end of file
+        if deadline is not None and self.deadline_missed:
+            # However early a late run is stopped, the team is paid up to the deadline
+            total_time = deadline
+        self.simulation_time = total_time
+        self.metrics.cost_tracker.set_simulation_time(total_time)
+        if self.trace is not None:
+            self.trace.close(self)
\ No newline at end of file
@@ -1,7 +1,7 @@
 # streamlit_app.py
 
 import streamlit as st
-from main_streamlit import run_simulation
+from result_cache import cached_simulation
 from visualisation.plotter import plot_simulation_results
 
 st.set_page_config(page_title="Development Sim", layout="wide")
@@ -92,7 +92,8 @@ run_clicked = st.button("**Run Simulation**", type="primary")
 # --- Run simulation ---
 if run_clicked:
     with st.spinner("Loading"):
-        metrics, config_used, sim_time = run_simulation(config=config)
+        # Repeat runs of the same configuration come straight from the result cache
+        metrics, config_used, sim_time = cached_simulation(config)
 
         st.write(f"**Simulation Time:** {sim_time:.0f} hours")
         st.write(f"**Items Developed:** {metrics.completed_items}")
@@ -1,10 +1,18 @@
 import streamlit as st
 import itertools
-from main_streamlit import run_simulation
+from functools import partial
+from optimiser import evaluate_batch, expand_replications, summarise_replications, default_workers
+from optimiser.prescreen import prescreen, run_pruned_sweep
+from optimiser.search import MonotoneSearch, pareto_frontier
+from optimiser.surrogate import SurrogateSearch
+from optimiser.halving import run_successive_halving
+from optimiser.what_if import results_arrays, reprice, feasible, best_config_index, pruned_could_win
+from metrics.cost_tracker import COST_ROLES
+from result_cache import cached_simulation
+from jobs import JobManager
+import numpy as np
 from visualisation.plotter import plot_simulation_results
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 import plotly.express as px
 
 st.set_page_config(page_title="Development Sim Optimiser", layout="wide")
@@ -57,32 +65,110 @@ with st.expander("**Configuration**", expanded=True):
         tester_min, tester_max = st.slider("Number of Testers", 1, 8, (1, 8))
         business_analyst_min, business_analyst_max = st.slider("Number of Business Analysts", 1, 8, (1, 8))
 
+    col5, col6 = st.columns(2)
+    with col5:
+        engine = st.radio("Simulation Engine", ["Event heap (exact)", "NumPy batch (fast, approximate)"],
+                          help="The batch engine runs the whole grid in one vectorised pass. "
+                               "Its results match the event engine statistically rather than run for run.")
+        strategy = st.selectbox("Search Strategy", ["Exhaustive grid", "Monotone search", "Surrogate model",
+                                                    "Successive halving"],
+                                help="Monotone search bisects the developer count for the smallest team meeting "
+                                     "the deadline on each line of the grid, then walks up from there while cost "
+                                     "per item keeps falling. It simulates far fewer configurations and shows "
+                                     "the cost against completion time frontier. The surrogate model learns run "
+                                     "times from the configurations simulated so far and picks the next batch "
+                                     "by expected improvement, stopping when little improvement is left. It "
+                                     "needs the fewest runs but may settle just short of the optimum. "
+                                     "Successive halving runs every configuration on a fraction of the work "
+                                     "items and seeds first, and only the cheapest third go on to longer runs "
+                                     "and the full replications. These three use the event heap engine.")
+    with col6:
+        workers = st.number_input("Parallel Workers", min_value=1, value=default_workers(),
+                                  help="Number of processes used to run the grid search")
+        replications = st.number_input("Replications per Configuration", min_value=1, value=5,
+                                       help="Each configuration is run with this many random seeds. Costs and times "
+                                            "are averaged, and a configuration only counts as meeting the deadline "
+                                            "if every replication does.")
+        common_random_numbers = st.checkbox("Common Random Numbers", value=True,
+                                            help="Every configuration sees the same test failures for the same work "
+                                                 "item in each replication, so differences between configurations "
+                                                 "come from the configuration rather than luck.")
+
 
 st.markdown("---")
 
 run_opt = st.button("Run Optimiser", type="primary")
 
-if run_opt:
-    all_configs = list(itertools.product(
-        range(dev_min, dev_max + 1),
-        range(tester_min, tester_max + 1),
-        range(business_analyst_min, business_analyst_max + 1),
-        range(wip_min, wip_max + 1)
-    ))
-
-    best_cost = float('inf')
-    best_metrics = None
-    best_config = None
-    best_sim_time = None
-
-    results_table = []
+costs = {
+    "developers": developer_cost,
+    "testers": tester_cost,
+    "business_analysts": business_analyst_cost
+}
+
+# Everything the simulations depend on. Hourly rates are left out on purpose:
+# when only they change, the finished sweep is re-priced instead of re-run.
+sweep_inputs = (num_work_items, delivery_deadline_hours, dev_min, dev_max, tester_min, tester_max,
+                business_analyst_min, business_analyst_max, wip_min, wip_max, engine, replications,
+                common_random_numbers, strategy)
+
+# Slice of the grid per NumPy batch pass, so progress shows and a cancel
+# takes effect between slices
+BATCH_SLICE = 512
+
+# Seconds between refreshes of a running job's results
+POLL_SECONDS = 1.0
+
+
+@st.cache_resource
+def job_manager():
+    # One per server and shared by all sessions, so a reloaded page can
+    # re-attach to its job
+    return JobManager()
+
+
+def run_strategy(job, strategy, engine, all_configs, grid, deadline_hours, replications, workers):
+    # Runs in the job's thread, so no st.* calls in here. Configs the
+    # analytical bounds rule out are never simulated, their statistics stay None.
     total_configs = len(all_configs)
-    skipped_configs = 0
+    if strategy == "Successive halving":
+        job.report = {"strategy": strategy}
+        for i, stats in run_successive_halving(all_configs, deadline_hours, replications, workers=workers,
+                                               report=job.report):
+            job.record(i, stats)
+        job.report["waves"] = len(job.report["rungs"])
+    elif strategy != "Exhaustive grid":
+        # Grid points are in the same order as all_configs
+        index = {point: i for i, point in enumerate(itertools.product(*grid.values()))}
+        search_class = MonotoneSearch if strategy == "Monotone search" else SurrogateSearch
+        search = search_class(all_configs[0], grid, deadline_hours, replications=replications, workers=workers,
+                              callback=lambda point, stats: job.record(index[point], stats))
+        search_report = search.run()
+        job.report = {"strategy": strategy, "total": total_configs, "evaluated": search_report["evaluated"],
+                      "waves": search_report["waves"]}
+    elif engine.startswith("NumPy"):
+        infeasible = prescreen(all_configs, deadline_hours)
+        candidates = [i for i in range(total_configs) if not infeasible[i]]
+        job.expected = len(candidates)
+        job.report = {"total": total_configs, "infeasible": int(infeasible.sum()), "dominated": 0,
+                      "evaluated": len(candidates), "pruned": {}}
+        for start in range(0, len(candidates), BATCH_SLICE):
+            chunk = candidates[start:start + BATCH_SLICE]
+            runs = evaluate_batch(expand_replications([all_configs[i] for i in chunk], replications),
+                                  deadline_hours=deadline_hours)
+            for k, i in enumerate(chunk):
+                job.record(i, summarise_replications(runs[k * replications:(k + 1) * replications]))
+    else:
+        # Results stream back in completion order, slot them back into grid order
+        report = {}
+        for i, stats in run_pruned_sweep(all_configs, deadline_hours, replications, workers=workers, report=report):
+            job.expected = total_configs - report["infeasible"]
+            job.record(i, stats)
+        job.report = report
 
-    progress_bar = st.progress(0)
 
-    for i, (num_developers, num_testers, num_business_analysts, wip_limit) in enumerate(all_configs):
-        config = {
+if run_opt:
+    all_configs = [
+        {
             "num_developers": num_developers,
             "num_testers": num_testers,
             "num_business_analysts": num_business_analysts,
@@ -91,50 +177,113 @@ if run_opt:
             "smoke_test_failure_chance": smoke_test_failure_chance,
             "durations": durations,
             "num_work_items": num_work_items,
-            "costs": {
-                "developers": developer_cost,
-                "testers": tester_cost,
-                "business_analysts": business_analyst_cost
-            }
+            "engine": "heap",
+            "common_random_numbers": common_random_numbers,
+            "costs": costs
         }
+        for num_developers, num_testers, num_business_analysts, wip_limit in itertools.product(
+            range(dev_min, dev_max + 1),
+            range(tester_min, tester_max + 1),
+            range(business_analyst_min, business_analyst_max + 1),
+            range(wip_min, wip_max + 1)
+        )
+    ]
+    grid = {
+        "num_developers": list(range(dev_min, dev_max + 1)),
+        "num_testers": list(range(tester_min, tester_max + 1)),
+        "num_business_analysts": list(range(business_analyst_min, business_analyst_max + 1)),
+        "wip_limit": list(range(wip_min, wip_max + 1)),
+    }
+    if engine.startswith("NumPy") and strategy != "Exhaustive grid":
+        st.info(f"{strategy} runs on the event heap engine.")
+
+    # A new run replaces this session's previous job
+    previous = job_manager().get(st.session_state.get("job_id"))
+    if previous is not None and previous.running:
+        previous.cancel()
+    job = job_manager().submit(partial(run_strategy, strategy=strategy, engine=engine, all_configs=all_configs,
+                                       grid=grid, deadline_hours=delivery_deadline_hours,
+                                       replications=replications, workers=workers),
+                               len(all_configs), inputs=sweep_inputs, configs=all_configs, strategy=strategy)
+    st.session_state["job_id"] = job.id
+    st.query_params["job"] = job.id
+
+
+def show_progress(job):
+    if job.status == "queued":
+        st.info("Waiting for another optimisation to finish.")
+    elif job.cancel_requested:
+        st.info("Cancelling...")
+    else:
+        if job.expected:
+            st.progress(min(job.done / job.expected, 1.0))
+        st.caption(f"{job.done} configurations simulated in {job.elapsed():.0f} s. "
+                   "Results so far are shown below and update as runs finish.")
+    if not job.cancel_requested and st.button("Cancel", key="cancel_job"):
+        job.cancel()
+
+
+def show_results(job, final):
+    all_configs = job.info["configs"]
+    results = results_arrays(all_configs, job.snapshot())
+    prune_report = job.report
+
+    # --- Price the evaluated grid with the current rates ---
+    priced = reprice(results, costs)
+    meets_deadline = feasible(results, delivery_deadline_hours)
+    skipped_configs = int((results["evaluated"] & ~meets_deadline).sum())
+    best = int(best_config_index(results, costs, delivery_deadline_hours))
+    # Only configs the pre-screen skipped as dominated can be flagged, a
+    # search or halving leaves the rest of the grid unsimulated by design
+    pruned = [i for i, status in prune_report.get("pruned", {}).items() if status == "dominated"]
+
+    # The search reports are only complete once the job has finished
+    if final:
+        if prune_report.get("strategy") == "Successive halving":
+            st.caption("Successive halving: " + ", then ".join(
+                       f"{count} configurations on {items} items x {seeds} seeds" for count, items, seeds in prune_report["rungs"])
+                       + f", {prune_report['work']:.0%} of the simulation work of the full grid. "
+                       f"{prune_report['infeasible']} cannot meet the deadline even without rework or queueing.")
+        elif "strategy" in prune_report:
+            st.caption(f"{prune_report['strategy']}: {prune_report['evaluated']} of {prune_report['total']} "
+                       f"configurations simulated in {prune_report['waves']} rounds.")
+        else:
+            st.caption(f"Pre-screen: {prune_report['evaluated']} of {prune_report['total']} configurations simulated. "
+                       f"{prune_report['infeasible']} cannot meet the deadline even without rework or queueing, and "
+                       f"{prune_report['dominated']} cannot beat the best configuration found at the rates of the run.")
+        if pruned_could_win(results, costs, delivery_deadline_hours, pruned):
+            st.warning("At the current rates a configuration that was not simulated could be cheaper than the one "
+                       "shown. Select Run Optimiser to re-evaluate.")
+
+    results_table = [
+        {
+            "Developers": all_configs[i]["num_developers"],
+            "Testers": all_configs[i]["num_testers"],
+            "Business Analysts": all_configs[i]["num_business_analysts"],
+            "WIP Limit": all_configs[i]["wip_limit"],
+            "Avg Cost": round(priced["total_cost_mean"][i]),
+            "Avg Completed": results["completed_mean"][i],
+            "Cost per Item": round(priced["cost_per_item_mean"][i], 2),
+            "Cost per Item ±": round(priced["cost_per_item_ci"][i], 2),
+            "Time (hrs)": round(results["sim_time_mean"][i])
+        }
+        for i in range(len(all_configs)) if meets_deadline[i]
+    ]
 
-        metrics, config_used, sim_time = run_simulation(config=config)
-
-        # --- Time constraint check ---
-        if sim_time > delivery_deadline_hours:
-            skipped_configs += 1
-            progress_bar.progress((i + 1) / total_configs)
-            continue
-
-        cost = metrics.cost_tracker.compute_total_cost()
-        completed = metrics.completed_items
-        cost_per_item = cost / max(completed, 1)
-
-        results_table.append({
-            "Developers": num_developers,
-            "Testers": num_testers,
-            "Business Analysts": num_business_analysts,
-            "WIP Limit": wip_limit,
-            "Avg Cost": round(cost),
-            "Avg Completed": completed,
-            "Cost per Item": round(cost_per_item, 2),
-            "Time (hrs)": round(sim_time)
-        })
-
-        if cost_per_item < best_cost:
-            best_cost = cost_per_item
-            best_metrics = metrics
-            best_config = config_used
-            best_sim_time = sim_time
-
-        progress_bar.progress((i + 1) / total_configs)
-
-    if len(results_table) == 0:
+    if best < 0 and not final:
+        st.info("No configuration has met the delivery deadline yet.")
+    elif best < 0:
         st.warning("No configurations met the delivery deadline. Try increasing the number of weeks or expanding resource ranges.")
     else:
-        if skipped_configs > 0:
+        if skipped_configs > 0 and final:
             st.info(f"{skipped_configs} configurations skipped for exceeding the delivery deadline of {delivery_weeks} weeks.")
 
+        # Full metrics for the charts, from the result cache after the first
+        # time. While the job runs the best keeps changing, so they wait.
+        best_config = dict(all_configs[best], costs=costs)
+        if final:
+            best_metrics, best_config, best_sim_time = cached_simulation(best_config)
+
 # --- Show Best Config in three columns ---
 
         st.write("**Given**")
@@ -154,19 +303,35 @@ if run_opt:
             st.write(f"WIP Limit: {best_config['wip_limit']}")
 
         with col2:
-            st.markdown("**Results**")
-            st.write(f"Simulation Time: {best_sim_time:.0f} hours")
-            st.write(f"Total Cost: ${int(best_metrics.cost_tracker.compute_total_cost()):,}")
-            st.write(f"Items Developed: {best_metrics.completed_items}")
+            st.markdown(f"**Results** (mean ± 95% CI over {replications} replications)")
+            st.write(f"Simulation Time: {results['sim_time_mean'][best]:.0f} ± {results['sim_time_ci'][best]:.0f} hours")
+            st.write(f"Total Cost: ${priced['total_cost_mean'][best]:,.0f} ± ${priced['total_cost_ci'][best]:,.0f}")
+            st.write(f"Cost per Item: ${priced['cost_per_item_mean'][best]:,.2f} ± ${priced['cost_per_item_ci'][best]:,.2f}")
+            st.write(f"Items Developed: {results['completed_mean'][best]:.0f}")
 
         st.markdown("---")
 
         # --- Plot Results ---
-        fig = plot_simulation_results(best_metrics, best_config, best_sim_time)
-        st.pyplot(fig)
+        # Charts show the first replication (seed 42) of the optimal configuration
+        if final:
+            fig = plot_simulation_results(best_metrics, best_config, best_sim_time)
+            st.pyplot(fig)
 
         df_results = pd.DataFrame(results_table)
-        if not df_results.empty:
+        if job.info["strategy"] == "Monotone search" and not df_results.empty:
+            # Frontier at the current rates, the cheapest configuration for each completion time
+            frontier = pareto_frontier(list(zip(df_results["Time (hrs)"], df_results["Avg Cost"])))
+            df_results["Frontier"] = False
+            df_results.loc[frontier, "Frontier"] = True
+            fig_frontier = px.scatter(
+                df_results, x="Time (hrs)", y="Avg Cost", color="Frontier",
+                hover_data=["Developers", "Testers", "Business Analysts", "WIP Limit", "Cost per Item"],
+                title="Cost against Completion Time"
+            )
+            fig_frontier.add_scatter(x=df_results.loc[frontier, "Time (hrs)"], y=df_results.loc[frontier, "Avg Cost"],
+                                     mode="lines", line_shape="hv", name="Pareto frontier")
+            st.plotly_chart(fig_frontier, use_container_width=True)
+        elif not df_results.empty:
             fig_parallel = px.parallel_coordinates(
                 df_results,
                 dimensions=["Developers", "Testers", "Business Analysts", "WIP Limit", "Time (hrs)", "Avg Completed", "Avg Cost", "Cost per Item"],
@@ -186,8 +351,65 @@ if run_opt:
             )
             st.plotly_chart(fig_parallel, use_container_width=True)
 
+        # --- Rate sensitivity, re-pricing the same grid under many rate scenarios ---
+        if not final:
+            return
+        with st.expander("**Rate Sensitivity**"):
+            st.markdown("Optimal cost per item as one hourly rate is scaled and the others are held fixed. "
+                        "The evaluated grid is re-priced for every scenario, nothing is simulated again. "
+                        "Where a configuration skipped by the pre-screen might be cheaper, the point is "
+                        "marked as an upper bound.")
+            multipliers = np.linspace(0.5, 2.0, 31)
+            base_rates = np.array([costs[role] for _, role in COST_ROLES], dtype=float)
+            role_labels = {"developers": "Developer", "testers": "Tester", "business_analysts": "Business Analyst"}
+            rows = []
+            for r, (_, role) in enumerate(COST_ROLES):
+                scenarios = np.tile(base_rates, (len(multipliers), 1))
+                scenarios[:, r] *= multipliers
+                best_per_scenario = best_config_index(results, scenarios, delivery_deadline_hours)
+                cost_per_item = reprice(results, scenarios)["cost_per_item_mean"]
+                upper_bound = pruned_could_win(results, scenarios, delivery_deadline_hours, pruned)
+                for s_index, (multiplier, i) in enumerate(zip(multipliers, best_per_scenario)):
+                    rows.append({
+                        "Rate": role_labels[role],
+                        "Rate Multiplier": multiplier,
+                        "Cost per Item": cost_per_item[s_index, i],
+                        "Upper Bound": bool(upper_bound[s_index]),
+                        "Configuration": (f"{all_configs[i]['num_developers']} Dev / {all_configs[i]['num_testers']} Test / "
+                                          f"{all_configs[i]['num_business_analysts']} BA / WIP {all_configs[i]['wip_limit']}")
+                    })
+            fig_rates = px.line(pd.DataFrame(rows), x="Rate Multiplier", y="Cost per Item", color="Rate",
+                                hover_data=["Configuration", "Upper Bound"],
+                                title="Optimal Cost per Item under Rate Changes")
+            st.plotly_chart(fig_rates, use_container_width=True)
+
 
         # # --- Table of all results ---
         # st.markdown("**All Evaluated Configurations**")
         # results_table_sorted = sorted(results_table, key=lambda x: x["Cost per Item"])
         # st.dataframe(results_table_sorted, use_container_width=True)
+
+
+# Re-attach to this session's job, or after a reload to the one in the URL
+job_id = st.session_state.get("job_id") or st.query_params.get("job")
+job = job_manager().get(job_id) if job_id else None
+if job is not None and job.info["inputs"] != sweep_inputs:
+    st.info("The configuration has changed since the last run. Select Run Optimiser to update the results.")
+
+elif job is not None:
+    @st.fragment(run_every=POLL_SECONDS if job.running else None)
+    def show_job():
+        running = job.running
+        if running:
+            show_progress(job)
+        elif job.status == "cancelled":
+            st.warning(f"Cancelled after {job.done} configurations, the results below are partial.")
+        elif job.status == "failed":
+            st.error("The optimisation failed.")
+            st.code(job.error)
+        show_results(job, final=job.status == "finished")
+        # Once the job ends, rerun the whole page to stop polling
+        if running and not job.running:
+            st.rerun()
+
+    show_job()
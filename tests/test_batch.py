@@ -0,0 +1,42 @@
+# tests/test_batch.py
+import json
+import os
+
+import numpy as np
+
+from engines.batch import simulate_batch
+from simulator import Simulator
+from workflow import DEFAULT_WORKFLOW
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+
+def config_without_backlog(**overrides):
+    # Default pipeline minus Backlog, so the route starts at its WIP op
+    with open(CONFIG) as f:
+        config = json.load(f)
+    route = [step for step in DEFAULT_WORKFLOW['route'] if step != 'Backlog']
+    return dict(config, workflow=dict(DEFAULT_WORKFLOW, route=route), **overrides)
+
+
+def simpy_time(config, seed):
+    sim = Simulator(config, seed=seed)
+    sim.run_simulator()
+    return sim.env.now
+
+
+def test_route_starting_at_wip_matches_simpy():
+    # Without failures the runs are deterministic, so both engines agree exactly
+    config = config_without_backlog(test_failure_chance=0.0, smoke_test_failure_chance=0.0)
+    batch = simulate_batch([config], seeds=[1])
+    assert batch['completed'][0] == config['num_work_items']
+    assert batch['completion_time'][0] == simpy_time(config, seed=1)
+
+
+def test_route_starting_at_wip_agrees_statistically():
+    config = config_without_backlog()
+    seeds = list(range(8))
+    batch = simulate_batch([config] * len(seeds), seeds=seeds)
+    assert (batch['completed'] == config['num_work_items']).all()
+    simpy_mean = np.mean([simpy_time(config, seed) for seed in seeds])
+    assert abs(batch['completion_time'].mean() - simpy_mean) < 0.05 * simpy_mean
@@ -0,0 +1,61 @@
+# tests/test_durations.py
+import json
+import os
+
+import numpy as np
+
+from engines.batch import simulate_batch
+from event_trace import load_trace
+from simulator import Simulator
+
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+
+def sampled_config(**overrides):
+    with open(CONFIG) as f:
+        config = json.load(f)
+    durations = dict(config['durations'], Develop={'dist': 'lognormal', 'mean': 20, 'sd': 12},
+                     Test={'dist': 'gamma', 'mean': 8, 'sd': 4})
+    return dict(config, durations=durations, common_random_numbers=True, **overrides)
+
+
+def visit_durations(config, path, seed=3):
+    # {(item, stage): [duration of each visit]} from the run's trace
+    Simulator(dict(config, trace_path=path), seed=seed).run_simulator()
+    trace = load_trace(path)
+    started, durations = {}, {}
+    for time, item, stage, kind in zip(trace.time.tolist(), trace.item.tolist(),
+                                       trace.stage.tolist(), trace.kind.tolist()):
+        if kind == 1:
+            started[item, stage] = time
+        elif kind == 2:
+            durations.setdefault((item, stage), []).append(time - started[item, stage])
+    return durations
+
+
+def test_common_random_numbers_fix_durations_per_item(tmp_path):
+    # The same item takes the same time at every visit under any staffing
+    few = visit_durations(sampled_config(), str(tmp_path / 'few.trace'))
+    many = visit_durations(sampled_config(num_developers=9, num_testers=5), str(tmp_path / 'many.trace'))
+    assert few.keys() == many.keys()
+    for key in few:
+        assert np.allclose(few[key], many[key])
+
+
+def test_common_random_numbers_engines_agree(tmp_path):
+    simpy_run = visit_durations(sampled_config(), str(tmp_path / 'simpy.trace'))
+    heap_run = visit_durations(sampled_config(engine='heap'), str(tmp_path / 'heap.trace'))
+    assert simpy_run == heap_run
+
+
+def test_batch_draws_match_simulator(tmp_path):
+    # Both draw each item's failures and durations the same way, so each pool
+    # does the same total work
+    config = sampled_config()
+    durations = visit_durations(config, str(tmp_path / 'run.trace'), seed=5)
+    sim = Simulator(config)
+    busy = np.zeros(len(sim.workflow.pool_names))
+    for (item, stage), visits in durations.items():
+        busy[sim.workflow.stage_pool[stage]] += sum(visits)
+    batch = simulate_batch([config], seeds=[5])
+    assert np.allclose(batch['busy_time'][0], busy)
@@ -0,0 +1,40 @@
+# tests/test_heap.py
+import itertools
+
+import numpy as np
+import pytest
+
+from core import load_config
+from event_trace import load_trace
+from simulator import Simulator
+
+VARIANTS = [
+    {},
+    {'common_random_numbers': True},
+    {'arrival_mode': 'backlog'},
+    {'arrival_mode': 'open', 'arrival_rate': 0.5},
+    {'num_developers': 1, 'num_testers': 1, 'wip_limit': 2},
+    {'durations': dict(load_config()['durations'], Develop={'dist': 'lognormal', 'mean': 20, 'sd': 12})},
+]
+
+
+def run(config, seed, deadline, path):
+    sim = Simulator(dict(config, trace_path=path), seed=seed)
+    sim.run_simulator(deadline)
+    trace = load_trace(path)
+    return sim, [trace.time, trace.item, trace.stage, trace.kind]
+
+
+# 280 hours is missed part way through most runs
+@pytest.mark.parametrize('variant, deadline', list(itertools.product(VARIANTS, [None, 280])))
+def test_heap_replays_simpy_event_order(tmp_path, variant, deadline):
+    config = dict(load_config(), num_work_items=40, **variant)
+    for seed in (1, 2):
+        simpy_sim, simpy_events = run(config, seed, deadline, str(tmp_path / 'simpy.trace'))
+        heap_sim, heap_events = run(dict(config, engine='heap'), seed, deadline, str(tmp_path / 'heap.trace'))
+        # Every event, in the same order at the same time
+        for simpy_column, heap_column in zip(simpy_events, heap_events):
+            assert np.array_equal(simpy_column, heap_column)
+        assert heap_sim.simulation_time == simpy_sim.simulation_time
+        assert heap_sim.metrics.utilisation == simpy_sim.metrics.utilisation
+        assert heap_sim.metrics.wip_tracker.wip_log == simpy_sim.metrics.wip_tracker.wip_log
@@ -0,0 +1,15 @@
+# tests/test_result_cache.py
+from core import load_config
+from result_cache import ResultCache, cached_summary
+
+
+def test_deadline_answer_does_not_depend_on_cache_state():
+    # 400 hours is missed, but not at t=0
+    config = dict(load_config(), seed=3)
+    fresh = cached_summary(config, 400, cache=ResultCache(path=None))
+
+    cache = ResultCache(path=None)
+    full = cached_summary(config, cache=cache)
+    assert full['sim_time'] > 400
+    assert cached_summary(config, 400, cache=cache) == fresh
+    assert not fresh['met_deadline'] and fresh['sim_time'] == 400
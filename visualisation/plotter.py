@@ -1,6 +1,27 @@
+import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import matplotlib.patches as mpatches
+from matplotlib.collections import LineCollection
+from metrics import EFFICIENCY_BINS
+from workflow import pool_sizes, busy_key
+
+def downsample_minmax(times, values, num_bins):
+    # Keep the first, lowest, highest and last point of each of num_bins equal
+    # time bins, so a step trace drawn num_bins pixels wide looks the same but
+    # peaks and troughs are never lost
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(times) <= 4 * num_bins:
+        return times, values
+    span = times[-1] - times[0]
+    bins = np.minimum(((times - times[0]) / span * num_bins).astype(int), num_bins - 1) if span > 0 else np.zeros(len(times), dtype=int)
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+    # Sorted by bin then value, each bin's run starts at its minimum and ends at its maximum
+    order = np.lexsort((values, bins))
+    keep = np.unique(np.concatenate([starts, ends, order[starts], order[ends]]))
+    return times[keep], values[keep]
 
 def plot_simulation_results(metrics, config, simulation_time):
     # Access wait_times through the queue_tracker
@@ -11,30 +32,31 @@ def plot_simulation_results(metrics, config, simulation_time):
 
     # --- WIP Over Time Plot ---
     ax = axs[0]
-    times, wip_counts = zip(*metrics.wip_tracker.wip_log) if metrics.wip_tracker.wip_log else ([0], [0])
+    wip_log = np.array(metrics.wip_tracker.wip_log, dtype=float).reshape(-1, 2)
+    # About four points per pixel column of the axes is all that can be seen
+    times, wip_counts = downsample_minmax(wip_log[:, 0], wip_log[:, 1], max(int(ax.bbox.width), 1))
 
-    total_capacity = config['num_developers']
+    # Thresholds relative to the first pool, the developers in the default workflow
+    total_capacity = pool_sizes(config)[0][1]
     green_thresh = 1.0 * total_capacity
     orange_thresh = 1.2 * total_capacity
 
-    def get_color(value):
-        if value <= green_thresh:
-            return "green"
-        elif value <= orange_thresh:
-            return "orange"
-        else:
-            return "red"
-
-    for i in range(1, len(times)):
-        x0, x1 = times[i - 1], times[i]
-        y0, y1 = wip_counts[i - 1], wip_counts[i]
-
-        color = get_color(y0)
-        ax.plot([x0, x1], [y0, y0], color=color, linewidth=1)
-
-        if y0 != y1:
-            vcolor = get_color(y1)
-            ax.plot([x1, x1], [y0, y1], color=vcolor, linewidth=1)
+    def get_colors(values):
+        return np.select([values <= green_thresh, values <= orange_thresh],
+                         ["green", "orange"], default="red")
+
+    # Step trace as one LineCollection: a level segment coloured by its value,
+    # then a rise coloured by the new value wherever the WIP changes
+    x0, x1 = times[:-1], times[1:]
+    y0, y1 = wip_counts[:-1], wip_counts[1:]
+    changed = y0 != y1
+    segments = np.concatenate([
+        np.stack([np.column_stack([x0, y0]), np.column_stack([x1, y0])], axis=1),
+        np.stack([np.column_stack([x1, y0]), np.column_stack([x1, y1])], axis=1)[changed],
+    ])
+    colors = np.concatenate([get_colors(y0), get_colors(y1[changed])])
+    ax.add_collection(LineCollection(segments, colors=colors, linewidths=1))
+    ax.autoscale_view()
 
     ax.set_xlabel('Simulation Time (hours)')
     ax.set_ylabel('WIP (Items in System)')
@@ -51,11 +73,12 @@ def plot_simulation_results(metrics, config, simulation_time):
 
     # --- Resource Utilisation Plot with Warnings ---
     ax = axs[1]
-    dev_util = metrics.utilisation['Developers_busy_time'] / (config['num_developers'] * simulation_time)
-    test_util = metrics.utilisation['Testers_busy_time'] / (config['num_testers'] * simulation_time)
-    business_analyst_util = metrics.utilisation['Business_Analysts_busy_time'] / (config['num_business_analysts'] * simulation_time)
-    resources = ['Developers', 'Testers', 'Business Analysts']
-    utilisation = [dev_util, test_util, business_analyst_util]
+    resources = []
+    utilisation = []
+    for pool, size in pool_sizes(config):
+        resources.append(pool.replace('_', ' ').title())
+        # A deadline run proved late at t=0 has no time to divide by
+        utilisation.append(metrics.utilisation[busy_key(pool)] / (size * simulation_time) if simulation_time else 0.0)
 
     def util_color(util):
         if util <= 0.80:
@@ -86,18 +109,13 @@ def plot_simulation_results(metrics, config, simulation_time):
 
     # --- Flow Efficiency Histogram with Manual Thresholds ---
     ax = axs[2]
-    efficiencies = [
-        a / l if l > 0 else 0
-        for l, a in metrics.item_times
-    ]
-
     # Define manual bins based on thresholds
-    bins = [0.0, 0.25, 0.5, 0.75, 1.0]
+    bins = EFFICIENCY_BINS
     labels = ['Low', 'Medium', 'High', 'Very High']
     colors = ['red', 'orange', 'green', '#ccffcc']
 
-    # Plot histogram
-    counts, bins, patches = ax.hist(efficiencies, bins=bins, edgecolor='black')
+    # Plot histogram from the per-band counts, which streaming metrics also provide
+    counts, bins, patches = ax.hist(bins[:-1], bins=bins, weights=metrics.efficiency_histogram(), edgecolor='black')
 
     # Manually set colors based on thresholds
     for patch, color in zip(patches, colors):
@@ -119,10 +137,7 @@ def plot_simulation_results(metrics, config, simulation_time):
 
     # Filter out backlog stage
     filtered_stages = [s for s in stages if s.lower() != "backlog"]
-    filtered_waits = [
-        (sum(metrics.queue_tracker.wait_times[s]) / len(metrics.queue_tracker.wait_times[s]) if metrics.queue_tracker.wait_times[s] else 0.0)
-        for s in filtered_stages
-    ]
+    filtered_waits = [metrics.queue_tracker.mean_wait(s) for s in filtered_stages]
 
     # Manual threshold-based coloring
     def wait_color(wait):
@@ -158,3 +173,46 @@ def plot_simulation_results(metrics, config, simulation_time):
     for ax in axs:
         ax.set_facecolor('none')  # Transparent axes background
     return fig
+
+def plot_sensitivity(report, output='sim_time'):
+    # Tornado of the one-at-a-time swings, or bars of the Morris / Sobol
+    # indices, most influential factor at the top
+    indices = report['indices'][output]
+    factors = list(indices)[::-1]
+    labels = [f"{name} ({report['ranges'][name][0]:g}–{report['ranges'][name][1]:g})" for name in factors]
+    y = np.arange(len(factors))
+    fig, ax = plt.subplots(figsize=(10, 0.45 * len(factors) + 1.5), facecolor='none')
+
+    if report['method'] == 'one_at_a_time':
+        base = report['base'][output]
+        low = np.array([indices[name]['low'] for name in factors]) - base
+        high = np.array([indices[name]['high'] for name in factors]) - base
+        ax.barh(y, low, left=base, color='steelblue', label='Factor at low end')
+        ax.barh(y, high, left=base, color='darkorange', label='Factor at high end')
+        ax.axvline(base, color='black', linewidth=1)
+        ax.set_xlabel(f"{output} (base {base:,.1f})")
+        ax.set_title(f"One-at-a-time Sensitivity of {output}")
+    elif report['method'] == 'morris':
+        mu_star = [indices[name]['mu_star'] for name in factors]
+        sigma = [indices[name]['sigma'] for name in factors]
+        ax.barh(y + 0.2, mu_star, height=0.4, color='steelblue', label='μ* (mean |effect|)')
+        ax.barh(y - 0.2, sigma, height=0.4, color='darkorange', label='σ (non-linearity, interactions)')
+        ax.set_xlabel(f"Change in {output} over the factor's range")
+        ax.set_title(f"Morris Screening of {output}")
+    else:
+        for offset, key, color, label in [(0.2, 'first', 'steelblue', 'First order (S1)'),
+                                          (-0.2, 'total', 'darkorange', 'Total (ST)')]:
+            ax.barh(y + offset, [indices[name][key] for name in factors], height=0.4, color=color, label=label,
+                    xerr=[indices[name][f'{key}_ci'] for name in factors], capsize=3)
+        ax.set_xlim(left=min(0, ax.get_xlim()[0]))
+        ax.set_xlabel(f"Share of the variance of {output}")
+        ax.set_title(f"Sobol Indices of {output}")
+
+    ax.set_yticks(y)
+    ax.set_yticklabels(labels)
+    ax.grid(axis='x', linestyle='--', alpha=0.7)
+    ax.legend(loc='lower right')
+    plt.tight_layout()
+    fig.patch.set_alpha(0.0)
+    ax.set_facecolor('none')
+    return fig
@@ -0,0 +1,159 @@
+# workflow.py
+#
+# The delivery pipeline as data. A config may carry a "workflow" describing
+# its resource pools, stages and route (DEFAULT_WORKFLOW, the pipeline the
+# simulator has always modelled, is used otherwise). Workflow compiles it once
+# per Simulator into integer-indexed tables that every engine, the metrics
+# and the optimiser's bounds read, so no stage is looked up by name on the
+# hot path.
+#
+#   "pools":  pool name -> headcount, either a config key ("num_developers",
+#             so it can be swept) or a number. Pool names key config["costs"].
+#   "stages": stage name -> {"pool", "priority" (lower is served first),
+#             optional "duration" (else config["durations"][name]), hours
+#             or a distribution (durations.py), and "active": false for
+#             stages that don't count as work time}.
+#   "route":  the stages an item visits in order. "WIP" marks where it takes
+#             a WIP slot (the start if absent), it gives the slot back at the
+#             end. {"fail": chance, "rework": [stages]} sends the item through
+#             the rework stages with that chance, the chance being a number
+#             or a config key ("test_failure_chance").
+
+from durations import parse_duration, mean_duration, min_duration
+
+STAGE = 0
+WIP_ENTER = 1
+BRANCH = 2
+WIP_EXIT = 3
+
+DEFAULT_WORKFLOW = {
+    'pools': {
+        'developers': 'num_developers',
+        'testers': 'num_testers',
+        'business_analysts': 'num_business_analysts',
+    },
+    'stages': {
+        'Backlog': {'pool': 'developers', 'priority': 6, 'active': False},
+        'Develop': {'pool': 'developers', 'priority': 5},
+        'Smoke_Test': {'pool': 'business_analysts', 'priority': 4},
+        'Test': {'pool': 'testers', 'priority': 3},
+        'Rework': {'pool': 'developers', 'priority': 2},
+        'ART': {'pool': 'developers', 'priority': 1},
+        'Release': {'pool': 'developers', 'priority': 0},
+    },
+    'route': [
+        'Backlog',
+        'WIP',
+        'Develop',
+        'Smoke_Test',
+        {'fail': 'smoke_test_failure_chance', 'rework': ['Rework', 'Smoke_Test']},
+        'Test',
+        {'fail': 'test_failure_chance', 'rework': ['Rework', 'Test']},
+        'ART',
+        'Release',
+    ],
+}
+
+
+def workflow_spec(config):
+    return config.get('workflow') or DEFAULT_WORKFLOW
+
+
+def pool_sizes(config):
+    # (pool name, headcount) for each pool of the config's workflow
+    return [(name, config[size] if isinstance(size, str) else size)
+            for name, size in workflow_spec(config)['pools'].items()]
+
+
+def busy_key(pool_name):
+    # Metrics.utilisation key, 'Developers_busy_time' for 'developers'
+    return pool_name.title() + '_busy_time'
+
+
+class Workflow:
+    """A config's workflow compiled to tables.
+
+    Stages and pools are numbered in the order the spec lists them. Per
+    stage: stage_pool, stage_priority, stage_duration (the mean for a
+    sampled stage), stage_min_duration, stage_distribution (the spec of a
+    sampled stage, else None) and stage_active (the mean duration if it
+    counts as work, else 0); sampled is True if any stage is. Per pool: pool_names,
+    pool_size_keys (the config key, or None for a fixed number),
+    pool_capacity. The route is a flat program of ops (op_kind, with
+    op_stage, op_prob, op_jump, op_rework and op_branch alongside): a BRANCH
+    falls through into its rework stages on failure and otherwise jumps to
+    op_jump past them. route_stages is the failure-free route, stages only.
+    """
+
+    def __init__(self, config):
+        spec = workflow_spec(config)
+        durations = config.get('durations', {})
+
+        self.pool_names = list(spec['pools'])
+        pool_index = {name: i for i, name in enumerate(self.pool_names)}
+        self.pool_size_keys = [size if isinstance(size, str) else None for size in spec['pools'].values()]
+        self.pool_capacity = [size for _, size in pool_sizes(config)]
+
+        self.stage_names = list(spec['stages'])
+        self.stage_index = {name: i for i, name in enumerate(self.stage_names)}
+        self.stage_pool, self.stage_priority, self.stage_duration, self.stage_active = [], [], [], []
+        self.stage_min_duration, self.stage_distribution = [], []
+        for name, stage in spec['stages'].items():
+            if stage['pool'] not in pool_index:
+                raise ValueError(f"Stage '{name}' uses unknown pool '{stage['pool']}'")
+            duration = stage['duration'] if 'duration' in stage else durations.get(name)
+            if duration is None:
+                raise ValueError(f"No duration for stage '{name}'")
+            duration = parse_duration(name, duration)
+            mean = mean_duration(duration)
+            self.stage_pool.append(pool_index[stage['pool']])
+            self.stage_priority.append(stage.get('priority', 0))
+            self.stage_duration.append(mean)
+            self.stage_min_duration.append(min_duration(duration))
+            self.stage_distribution.append(duration if isinstance(duration, dict) else None)
+            self.stage_active.append(mean if stage.get('active', True) else 0)
+        self.sampled = any(spec is not None for spec in self.stage_distribution)
+
+        route = list(spec['route'])
+        if 'WIP' not in route:
+            route.insert(0, 'WIP')
+        self.op_kind, self.op_stage, self.op_prob, self.op_jump, self.op_rework, self.op_branch = [], [], [], [], [], []
+        self.route_stages = []
+        self.num_branches = 0
+        for step in route:
+            if isinstance(step, dict):
+                chance = step['fail']
+                body = [self._stage(name) for name in step['rework']]
+                self._op(BRANCH, prob=config[chance] if isinstance(chance, str) else chance,
+                         jump=len(self.op_kind) + 1 + len(body), rework=body, branch=self.num_branches)
+                self.num_branches += 1
+                for stage in body:
+                    self._op(STAGE, stage=stage)
+            elif step == 'WIP':
+                self._op(WIP_ENTER)
+            else:
+                stage = self._stage(step)
+                self.route_stages.append(stage)
+                self._op(STAGE, stage=stage)
+        self._op(WIP_EXIT)
+        if self.op_kind.count(WIP_ENTER) != 1:
+            raise ValueError("A workflow route has at most one 'WIP'")
+        # Failure-free route after the WIP slot is taken
+        wip_step = sum(1 for step in route[:route.index('WIP')] if not isinstance(step, dict))
+        self.wip_stages = self.route_stages[wip_step:]
+
+    def _stage(self, name):
+        if name not in self.stage_index:
+            raise ValueError(f"Workflow route uses unknown stage '{name}'")
+        return self.stage_index[name]
+
+    def _op(self, kind, stage=-1, prob=0.0, jump=-1, rework=None, branch=-1):
+        self.op_kind.append(kind)
+        self.op_stage.append(stage)
+        self.op_prob.append(prob)
+        self.op_jump.append(jump)
+        self.op_rework.append(rework)
+        self.op_branch.append(branch)
+
+    def busy_keys(self):
+        return [busy_key(name) for name in self.pool_names]